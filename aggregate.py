@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+import re
+
+PERCENTILES = (0.5, 0.95)
+EPOCH = datetime(1970, 1, 1)
+
+_BUCKET_RE = re.compile(r'^(\d+)\s*([smhd]?)$')
+_BUCKET_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_bucket(value):
+    """'300', '30s', '5m', '1h', '1d' -> segundos."""
+    match = _BUCKET_RE.match((value or '').strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f'Bucket inválido: {value!r} (ex: 30s, 5m, 1h, 1d)')
+    return int(match.group(1)) * _BUCKET_UNITS[match.group(2)]
+
+
+def parse_time(value):
+    """ISO 8601 ou segundos desde a época -> datetime local (sem fuso)."""
+    try:
+        return datetime.fromtimestamp(float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Data inválida: {value!r}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _row(bucket_start, angle, count, minimum, maximum, mean, percentiles):
+    row = {
+        'bucket': bucket_start.isoformat(),
+        'angle': int(angle),
+        'count': int(count),
+        'min': int(minimum),
+        'max': int(maximum),
+        'mean': round(float(mean), 3),
+    }
+    for q, value in zip(PERCENTILES, percentiles):
+        row[f'p{int(q * 100)}'] = round(float(value), 3) if value is not None else None
+    return row
+
+
+# Agregação feita no PostgreSQL: só sobem bucket_count x ângulos linhas.
+# Com buckets de minutos inteiros, junta também os resumos de radar_data_minute
+# (leituras já removidas pela retenção); nesses buckets só há percentis se
+# ainda existirem leituras brutas. Sem ``device`` soma todos os dispositivos.
+def aggregate_sql(conn, start, end, bucket, angle=None, with_rollups=True, device=None):
+    filters = ' AND angle = %(angle)s' if angle is not None else ''
+    if device is not None:
+        filters += ' AND device_id = %(device)s'
+    raw_sql = f'''
+        SELECT TIMESTAMP 'epoch'
+                   + floor(extract(epoch FROM created_at) / %(bucket)s) * %(bucket)s
+                   * INTERVAL '1 second' AS bucket,
+               angle,
+               count(*) AS count,
+               min(distance) AS min_distance,
+               max(distance) AS max_distance,
+               sum(distance)::float8 AS sum_distance,
+               percentile_cont(%(percentiles)s) WITHIN GROUP (ORDER BY distance) AS percentiles
+        FROM radar_data
+        WHERE created_at >= %(start)s AND created_at < %(end)s{filters}
+        GROUP BY 1, 2
+    '''
+    if with_rollups and bucket % 60 == 0:
+        sql = f'''
+            WITH raw AS ({raw_sql}),
+            rolled AS (
+                SELECT TIMESTAMP 'epoch'
+                           + floor(extract(epoch FROM bucket) / %(bucket)s) * %(bucket)s
+                           * INTERVAL '1 second' AS bucket,
+                       angle,
+                       sum(count) AS count,
+                       min(min_distance) AS min_distance,
+                       max(max_distance) AS max_distance,
+                       sum(sum_distance)::float8 AS sum_distance
+                FROM radar_data_minute
+                WHERE bucket >= %(start)s AND bucket < %(end)s{filters}
+                GROUP BY 1, 2
+            )
+            SELECT COALESCE(r.bucket, s.bucket),
+                   COALESCE(r.angle, s.angle),
+                   COALESCE(r.count, 0) + COALESCE(s.count, 0),
+                   LEAST(r.min_distance, s.min_distance),
+                   GREATEST(r.max_distance, s.max_distance),
+                   (COALESCE(r.sum_distance, 0) + COALESCE(s.sum_distance, 0))
+                       / (COALESCE(r.count, 0) + COALESCE(s.count, 0)),
+                   r.percentiles
+            FROM raw r
+            FULL OUTER JOIN rolled s ON r.bucket = s.bucket AND r.angle = s.angle
+            ORDER BY 1, 2
+        '''
+    else:
+        sql = f'''
+            SELECT bucket, angle, count, min_distance, max_distance,
+                   sum_distance / count, percentiles
+            FROM ({raw_sql}) raw
+            ORDER BY 1, 2
+        '''
+    params = {
+        'bucket': bucket,
+        'percentiles': list(PERCENTILES),
+        'start': start,
+        'end': end,
+        'angle': angle,
+        'device': device,
+    }
+
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return [_row(r[0], r[1], r[2], r[3], r[4], r[5], r[6] or [None] * len(PERCENTILES))
+                for r in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def _concat(np, segments, dtype):
+    if not segments:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate([np.asarray(seg) for seg in segments]).astype(dtype, copy=False)
+
+
+# A mesma agregação, vetorizada com NumPy, sobre as colunas do buffer em memória
+# (dict de segmentos devolvido por RadarRingBuffer.views)
+def aggregate_columns(columns, start, end, bucket, angle=None):
+    import numpy as np
+
+    received_at = _concat(np, columns['received_at'], np.float64)
+    angles = _concat(np, columns['angle'], np.int64)
+    distances = _concat(np, columns['distance'], np.float64)
+
+    mask = (received_at >= start.timestamp()) & (received_at < end.timestamp())
+    if angle is not None:
+        mask &= angles == angle
+    if not mask.any():
+        return []
+    received_at, angles, distances = received_at[mask], angles[mask], distances[mask]
+
+    # Alinhar os buckets à hora local, como o PostgreSQL faz com TIMESTAMP sem fuso
+    utc_offset = (start - (EPOCH + timedelta(seconds=start.timestamp()))).total_seconds()
+    buckets = np.floor((received_at + utc_offset) / bucket).astype(np.int64)
+    # Ordenar por (bucket, ângulo, distância): cada grupo fica contíguo e ordenado
+    order = np.lexsort((distances, angles, buckets))
+    buckets, angles, distances = buckets[order], angles[order], distances[order]
+
+    change = np.empty(len(buckets), dtype=bool)
+    change[0] = True
+    change[1:] = (buckets[1:] != buckets[:-1]) | (angles[1:] != angles[:-1])
+    starts = np.flatnonzero(change)
+    counts = np.diff(np.append(starts, len(buckets)))
+
+    minimum = distances[starts]
+    maximum = distances[starts + counts - 1]
+    mean = np.add.reduceat(distances, starts) / counts
+
+    percentiles = []
+    for q in PERCENTILES:
+        # Interpolação linear, igual ao percentile_cont do PostgreSQL
+        position = starts + q * (counts - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        percentiles.append(distances[low] + (distances[high] - distances[low]) * (position - low))
+
+    return [
+        _row(EPOCH + timedelta(seconds=int(buckets[s]) * bucket), angles[s], counts[i],
+             minimum[i], maximum[i], mean[i], [p[i] for p in percentiles])
+        for i, s in enumerate(starts)
+    ]
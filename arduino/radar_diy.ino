@@ -31,6 +31,18 @@ const char* SSID = "iPhone de Owen";
 const char* PASSWORD = "1234567890";
 const char* HOST = "tam-owens-projects-0be75bfe.vercel.app";
 
+// Protocolo binário: um frame por varrimento (ver radar_protocol.py)
+const uint16_t DEVICE_ID = 1;
+const uint8_t FRAME_VERSION = 1;
+const int FRAME_HEADER_SIZE = 15;
+const int FRAME_RECORD_SIZE = 5;
+const int MAX_RECORDS = 40; // 0-180° em passos de 5° = 37 leituras
+uint8_t frame[FRAME_HEADER_SIZE + MAX_RECORDS * FRAME_RECORD_SIZE + 2];
+uint8_t recordCount = 0;
+uint32_t sweepSeq = 0;
+unsigned long sweepStart = 0;
+int stepsInSweep = 0;
+
 void setup() {
   Serial.begin(9600);
   esp8266.begin(9600);
@@ -149,56 +161,131 @@ void indicateActivity() {
   // A cor normal será restaurada na próxima leitura
 }
 
-void sendToAPI(int angle, int distance) {
-  if (distance > 2 && distance < 400) { // Filtro para valores válidos
-    
-    if (!wifiConnected) {
-      // Tentar reconectar se WiFi caiu
-      connectWiFi();
-      if (!wifiConnected) {
-        return;
+// Esperar por uma resposta do ESP8266 (sai assim que o token chega)
+bool waitFor(const char* token, unsigned long timeout) {
+  String response = "";
+  unsigned long start = millis();
+  while (millis() - start < timeout) {
+    while (esp8266.available()) {
+      response += (char)esp8266.read();
+      if (response.indexOf(token) != -1) {
+        return true;
+      }
+      if (response.length() > 64) {
+        response = response.substring(response.length() - 32);
       }
     }
-    
-    // Criar JSON com dados
-    String jsonData = "{\"angle\":" + String(angle) + 
-                     ",\"distance\":" + String(distance) + 
-                     ",\"timestamp\":" + String(millis()) + "}";
-    
-    // Preparar comando HTTP
-    String httpCmd = "AT+CIPSTART=\"TCP\",\"" + String(HOST) + "\",80";
-    String response = sendCommand(httpCmd, 5000);
-    
-    if (response.indexOf("OK") != -1 || response.indexOf("CONNECT") != -1) {
-      
-      String postRequest = "POST /api/radar/data HTTP/1.1\r\n";
-      postRequest += "Host: " + String(HOST) + "\r\n";
-      postRequest += "Content-Type: application/json\r\n";
-      postRequest += "Content-Length: " + String(jsonData.length()) + "\r\n";
-      postRequest += "Connection: close\r\n\r\n";
-      postRequest += jsonData;
-      
-      // Enviar dados
-      String sendCmd = "AT+CIPSEND=" + String(postRequest.length());
-      response = sendCommand(sendCmd, 3000);
-      
-      if (response.indexOf(">") != -1 || response.indexOf("SEND") != -1) {
-        sendCommand(postRequest, 3000);
+  }
+  Serial.println("⏱️ Timeout à espera de: " + String(token));
+  return false;
+}
+
+bool sendCommandWait(String command, const char* token, unsigned long timeout) {
+  Serial.println("Comando: " + command);
+  esp8266.println(command);
+  return waitFor(token, timeout);
+}
+
+void putU16(uint8_t* p, uint16_t value) {
+  p[0] = value & 0xFF;
+  p[1] = value >> 8;
+}
+
+void putU32(uint8_t* p, uint32_t value) {
+  putU16(p, value & 0xFFFF);
+  putU16(p + 2, value >> 16);
+}
+
+// CRC-16/CCITT-FALSE (igual a radar_protocol.crc16)
+uint16_t crc16(const uint8_t* data, int length) {
+  uint16_t crc = 0xFFFF;
+  for (int i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Guardar a leitura no frame do varrimento atual
+void addReading(int angle, int distance) {
+  if (distance <= 2 || distance >= 400) { // Filtro para valores válidos
+    return;
+  }
+  if (recordCount >= MAX_RECORDS) {
+    return;
+  }
+  if (recordCount == 0) {
+    sweepStart = millis();
+  }
+  uint8_t* record = frame + FRAME_HEADER_SIZE + recordCount * FRAME_RECORD_SIZE;
+  record[0] = angle;
+  putU16(record + 1, distance);
+  putU16(record + 3, millis() - sweepStart);
+  recordCount++;
+}
+
+// Enviar o varrimento completo num único POST binário (ver radar_protocol.py)
+void sendSweep() {
+  if (recordCount == 0) {
+    return;
+  }
+
+  if (!wifiConnected) {
+    // Tentar reconectar se WiFi caiu
+    connectWiFi();
+    if (!wifiConnected) {
+      recordCount = 0;
+      return;
+    }
+  }
+
+  frame[0] = 'R';
+  frame[1] = 'D';
+  frame[2] = FRAME_VERSION;
+  frame[3] = 0; // flags
+  putU16(frame + 4, DEVICE_ID);
+  putU32(frame + 6, sweepSeq);
+  putU32(frame + 10, sweepStart);
+  frame[14] = recordCount;
+  int frameLength = FRAME_HEADER_SIZE + recordCount * FRAME_RECORD_SIZE;
+  putU16(frame + frameLength, crc16(frame, frameLength));
+  frameLength += 2;
+
+  String header = "POST /api/radar/frame HTTP/1.1\r\n";
+  header += "Host: " + String(HOST) + "\r\n";
+  header += "Content-Type: application/octet-stream\r\n";
+  header += "Content-Length: " + String(frameLength) + "\r\n";
+  header += "Connection: close\r\n\r\n";
+
+  String httpCmd = "AT+CIPSTART=\"TCP\",\"" + String(HOST) + "\",80";
+  if (sendCommandWait(httpCmd, "CONNECT", 5000)) {
+    String sendCmd = "AT+CIPSEND=" + String(header.length() + frameLength);
+    if (sendCommandWait(sendCmd, ">", 2000)) {
+      esp8266.print(header);
+      esp8266.write(frame, frameLength);
+      if (waitFor("SEND OK", 5000)) {
         lastDataSent = millis();
         indicateActivity(); // Piscar LED para indicar envio
-        Serial.println("✅ Dados enviados para API!");
+        Serial.println("✅ Varrimento enviado para API! (" + String(recordCount) + " leituras)");
       } else {
         Serial.println("❌ Falha no envio");
       }
-      
-      // Fechar conexão
-      sendCommand("AT+CIPCLOSE", 1000);
     } else {
-      Serial.println("❌ Falha na conexão com API");
-      wifiConnected = false;
-      setColor(255, 0, 0); // Vermelho (erro)
+      Serial.println("❌ Falha no envio");
     }
+
+    // Fechar conexão
+    sendCommandWait("AT+CIPCLOSE", "OK", 1000);
+  } else {
+    Serial.println("❌ Falha na conexão com API");
+    wifiConnected = false;
+    setColor(255, 0, 0); // Vermelho (erro)
   }
+
+  sweepSeq++;
+  recordCount = 0;
 }
 
 void checkStatus() {
@@ -220,8 +307,15 @@ void loop() {
   // Indicar distância no LED RGB
   updateLED(distance);
   
-  // Enviar dados para API
-  sendToAPI(angle, distance);
+  // Guardar leitura no varrimento atual
+  addReading(angle, distance);
+  stepsInSweep++;
+  
+  // Extremo do varrimento (0° ou 180°): enviar o frame completo
+  if ((angle >= 180 || angle <= 0) && stepsInSweep > 1) {
+    sendSweep();
+    stepsInSweep = 0;
+  }
   
   // Verificar status do sistema
   checkStatus();
@@ -0,0 +1,321 @@
+"""Benchmark reprodutível da API Flask.
+
+Cada cenário corre num subprocesso próprio (configuração por variáveis de
+ambiente, como em produção) e mede throughput, latência p50/p95/p99 e
+memória. O resultado é JSON, para comparar entre commits:
+
+    python bench/run_bench.py --out bench_output.json
+    python bench/run_bench.py --stores memory --transports client --workloads ingest_frame
+    python bench/run_bench.py --pg-host /tmp/pgdata --pg-user postgres --pg-db postgres
+
+Os cenários "sqlite" e "shared" usam um ficheiro temporário; sem --pg-host os
+cenários PostgreSQL são marcados como "skipped".
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from radar_protocol import HEADER_SIZE, RECORD_SIZE  # noqa: E402
+from simulator import RadarSimulator  # noqa: E402
+
+WORKLOADS = ('ingest_single', 'ingest_batch', 'ingest_frame', 'read_latest', 'read_latest_etag')
+TRANSPORTS = ('client', 'wsgi')
+STORES = ('memory', 'shared', 'sqlite', 'postgres')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    position = q * (len(sorted_values) - 1)
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_kb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+# --- transportes -----------------------------------------------------------
+
+class ClientTransport:
+    """Flask test client: mede a aplicação sem rede nem servidor."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, data=body, headers=headers or {})
+        return response.status_code, response.headers.get('ETag')
+
+    def close(self):
+        pass
+
+
+class WSGITransport:
+    """HTTP/1.1 keep-alive contra um servidor WSGI real (werkzeug, multithread)."""
+
+    def __init__(self, address):
+        self.conn = http.client.HTTPConnection(*address, timeout=30)
+
+    def request(self, method, path, body=None, headers=None):
+        self.conn.request(method, path, body=body, headers=headers or {})
+        response = self.conn.getresponse()
+        response.read()
+        return response.status, response.getheader('ETag')
+
+    def close(self):
+        self.conn.close()
+
+
+# --- cenário (executado dentro do subprocesso) -----------------------------
+
+def run_scenario(config):
+    if not config.get('log'):
+        logging.disable(logging.INFO)
+    rss_before = rss_kb()
+    import_started = time.perf_counter()
+    import index
+    import_seconds = time.perf_counter() - import_started
+
+    # A app só conecta ao PostgreSQL no primeiro pedido
+    database = index.app.test_client().get('/api/status').get_json()['database']
+    actual_store = 'postgres' if database == 'postgresql' else database
+    if actual_store != config['store']:
+        return {'skipped': f"store {config['store']} indisponível"}
+    index.app.test_client().delete('/api/radar/clear')
+
+    server = None
+    if config['transport'] == 'wsgi':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, index.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        make_transport = lambda: WSGITransport(server.server_address)  # noqa: E731
+    else:
+        make_transport = lambda: ClientTransport(index.app)  # noqa: E731
+
+    workload = config['workload']
+    devices = config['devices']
+    per_device = config['requests']
+    interval = 1.0 / config['rate'] if config['rate'] else 0.0
+
+    # Para leituras: pré-carregar um histórico
+    if workload.startswith('read_'):
+        preload = RadarSimulator(device_id=999)
+        for _ in range(config['preload'] // 37 + 1):
+            index.app.test_client().post('/api/radar/batch', json=preload.sweep())
+
+    latencies = [[] for _ in range(devices)]
+    errors = [0] * devices
+    readings = [0] * devices
+    start_barrier = threading.Barrier(devices + 1)
+
+    def device(i):
+        sim = RadarSimulator(device_id=i + 1)
+        transport = make_transport()
+        etag = None
+        start_barrier.wait()
+        next_at = time.perf_counter()
+        try:
+            for _ in range(per_device):
+                if interval:
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_at += interval
+                headers = {}
+                if workload == 'ingest_single':
+                    body = json.dumps(sim.next_reading())
+                    method, path, count = 'POST', '/api/radar/data', 1
+                    headers['Content-Type'] = 'application/json'
+                elif workload == 'ingest_batch':
+                    sweep = sim.sweep()
+                    body = json.dumps(sweep)
+                    method, path, count = 'POST', '/api/radar/batch', len(sweep)
+                    headers['Content-Type'] = 'application/json'
+                elif workload == 'ingest_frame':
+                    body = sim.sweep_frame()
+                    method, path, count = 'POST', '/api/radar/frame', (len(body) - HEADER_SIZE - 2) // RECORD_SIZE
+                    headers['Content-Type'] = 'application/octet-stream'
+                else:
+                    body = None
+                    method, path, count = 'GET', '/api/radar/latest', 0
+                    if workload == 'read_latest_etag' and etag:
+                        headers['If-None-Match'] = etag
+                started = time.perf_counter()
+                try:
+                    status, new_etag = transport.request(method, path, body, headers)
+                except Exception:
+                    status, new_etag = 599, None
+                latencies[i].append((time.perf_counter() - started) * 1000)
+                if status >= 400:
+                    errors[i] += 1
+                else:
+                    readings[i] += count
+                    etag = new_etag or etag
+        finally:
+            transport.close()
+
+    threads = [threading.Thread(target=device, args=(i,)) for i in range(devices)]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+    if getattr(index, 'write_behind', None) is not None:
+        index.write_behind.close()
+
+    all_latencies = sorted(x for per in latencies for x in per)
+    total = len(all_latencies)
+    return {
+        'requests': total,
+        'errors': sum(errors),
+        'readings': sum(readings),
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        'readings_per_s': round(sum(readings) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(all_latencies) / total, 4) if total else None,
+            'p50': round(percentile(all_latencies, 0.50), 4) if total else None,
+            'p95': round(percentile(all_latencies, 0.95), 4) if total else None,
+            'p99': round(percentile(all_latencies, 0.99), 4) if total else None,
+            'max': round(all_latencies[-1], 4) if total else None,
+        },
+        'memory_kb': {
+            'rss_before': rss_before,
+            'rss_after': rss_kb(),
+            'rss_peak': peak_rss_kb(),
+        },
+        'import_seconds': round(import_seconds, 4),
+    }
+
+
+# --- orquestração ----------------------------------------------------------
+
+def scenario_env(args, store, workdir):
+    env = dict(os.environ)
+    env['DB_JOURNAL_PATH'] = os.path.join(workdir, 'journal.bin')
+    env.update(args.env)
+    if store in ('memory', 'shared', 'sqlite'):
+        # Porta recusada de imediato: a app cai no engine local sem esperar
+        env.update({'DB_HOST': '127.0.0.1', 'DB_PORT': '9', 'STORAGE_ENGINE': store,
+                    'SQLITE_PATH': os.path.join(workdir, 'bench.db'),
+                    'SHARED_MEMORY_PATH': os.path.join(workdir, 'bench.ring')})
+    else:
+        env.update({
+            'DB_HOST': args.pg_host,
+            'DB_PORT': str(args.pg_port),
+            'DB_NAME': args.pg_db,
+            'DB_USER': args.pg_user,
+            'DB_PASSWORD': args.pg_password,
+        })
+    return env
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da API do Radar DIY')
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument('--transports', nargs='+', choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument('--stores', nargs='+', choices=STORES, default=list(STORES))
+    parser.add_argument('--devices', type=int, default=4, help='dispositivos simultâneos (threads)')
+    parser.add_argument('--requests', type=int, default=200, help='pedidos por dispositivo')
+    parser.add_argument('--rate', type=float, default=0, help='pedidos/s por dispositivo (0 = máximo)')
+    parser.add_argument('--preload', type=int, default=1000, help='leituras pré-carregadas para read_*')
+    parser.add_argument('--pg-host', default=None)
+    parser.add_argument('--pg-port', type=int, default=5432)
+    parser.add_argument('--pg-db', default='postgres')
+    parser.add_argument('--pg-user', default='postgres')
+    parser.add_argument('--pg-password', default='')
+    parser.add_argument('--set', dest='env', action='append', default=[], metavar='VAR=VALOR',
+                        help='variável de ambiente extra para a app (repetível)')
+    parser.add_argument('--log', action='store_true', help='manter os logs INFO da app')
+    parser.add_argument('--out', default=None, help='ficheiro JSON de saída (padrão: stdout)')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_scenario(json.loads(args.worker))))
+        return
+
+    args.env = dict(item.split('=', 1) for item in args.env)
+    workdir = tempfile.mkdtemp(prefix='radar-bench-')
+    results = []
+    for store in args.stores:
+        for transport in args.transports:
+            for workload in args.workloads:
+                name = f'{store}/{transport}/{workload}'
+                config = {
+                    'store': store, 'transport': transport, 'workload': workload,
+                    'devices': args.devices, 'requests': args.requests, 'rate': args.rate,
+                    'preload': args.preload, 'log': args.log,
+                }
+                if store == 'postgres' and not args.pg_host:
+                    results.append({'name': name, **config, 'skipped': 'sem --pg-host'})
+                    continue
+                print(f'▶ {name}', file=sys.stderr)
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+                    env=scenario_env(args, store, workdir), cwd=ROOT, capture_output=True, text=True
+                )
+                if proc.returncode != 0:
+                    results.append({'name': name, **config, 'error': proc.stderr.strip()[-2000:]})
+                    continue
+                results.append({'name': name, **config, **json.loads(proc.stdout.strip().splitlines()[-1])})
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'env': args.env,
+        'scenarios': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Simulador de radar: reproduz o varrimento do firmware (arduino/radar_diy.ino).
+
+O servo vai de 0° a 180° e volta, em passos de ``step`` graus; cada passo
+gera uma leitura. Os obstáculos são sintéticos mas determinísticos (seed),
+para que duas execuções do benchmark enviem exatamente os mesmos dados.
+"""
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from radar_protocol import encode_frame  # noqa: E402
+
+
+class RadarSimulator:
+
+    def __init__(self, device_id=1, step=5, max_angle=180, step_ms=550, seed=None, obstacles=3):
+        self.device_id = device_id
+        self.step = step
+        self.max_angle = max_angle
+        self.step_ms = step_ms  # delay(50) + medição + delay(500) do firmware
+        self.random = random.Random(device_id if seed is None else seed)
+        self.obstacles = [
+            (self.random.uniform(0, max_angle), self.random.uniform(10, 25), self.random.randint(15, 150))
+            for _ in range(obstacles)
+        ]
+        self.angle = 0
+        self.forward = True
+        self.millis = 0
+        self.sweep_seq = 0
+
+    def _distance(self, angle):
+        distance = 300
+        for center, width, obstacle in self.obstacles:
+            if abs(angle - center) <= width / 2:
+                distance = min(distance, obstacle)
+        noise = self.random.gauss(0, 2)
+        # Drift lento dos obstáculos entre varrimentos
+        drift = 5 * math.sin(self.sweep_seq / 10 + angle / 30)
+        return max(3, min(399, int(distance + noise + drift)))
+
+    def next_reading(self):
+        reading = {'angle': self.angle, 'distance': self._distance(self.angle), 'timestamp': self.millis,
+                   'device_id': self.device_id}
+        self.millis += self.step_ms
+        if self.forward:
+            self.angle += self.step
+            if self.angle >= self.max_angle:
+                self.forward = False
+        else:
+            self.angle -= self.step
+            if self.angle <= 0:
+                self.forward = True
+        return reading
+
+    def readings(self, n):
+        return [self.next_reading() for _ in range(n)]
+
+    def sweep(self):
+        """Leituras até ao próximo extremo (0° ou 180°), como o firmware envia."""
+        readings = [self.next_reading()]
+        while readings[-1]['angle'] not in (0, self.max_angle) or len(readings) == 1:
+            readings.append(self.next_reading())
+        self.sweep_seq += 1
+        return readings
+
+    def sweep_frame(self):
+        """Um varrimento codificado no protocolo binário do firmware."""
+        readings = self.sweep()
+        base = readings[0]['timestamp']
+        records = [(r['angle'], r['distance'], r['timestamp'] - base) for r in readings]
+        return encode_frame(self.device_id, self.sweep_seq, base, records)
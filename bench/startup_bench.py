@@ -0,0 +1,157 @@
+"""Benchmark do arranque a frio: do lançamento do processo à primeira resposta.
+
+Cada execução é um processo Python novo (como um cold start no Vercel ou o
+boot de um worker) e mede:
+
+- ``import``: tempo de ``import index``;
+- ``first_response``: primeiro pedido que não precisa da base (/api/health);
+- ``first_data``: primeiro pedido que lê dados (/api/radar/latest), que é
+  quem paga a conexão preguiçosa ao PostgreSQL;
+- ``spawn_to_first_response``: do arranque do interpretador à primeira resposta.
+
+    python bench/startup_bench.py --runs 10
+    python bench/startup_bench.py --stores memory unreachable --out startup.json
+    python bench/startup_bench.py --pg-host /tmp/pgdata --pg-user postgres --pg-db postgres
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_bench import git_commit, percentile  # noqa: E402
+
+STORES = ('memory', 'sqlite', 'unreachable', 'postgres')
+PHASES = ('import', 'first_response', 'first_data', 'spawn_to_first_response')
+
+
+def run_worker(spawned_at):
+    logging.disable(logging.INFO)
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import index
+    imported = time.perf_counter()
+    client = index.app.test_client()
+    status = client.get('/api/health').status_code
+    first_response = time.perf_counter()
+    spawn_to_first_response = time.time() - spawned_at
+    data_status = client.get('/api/radar/latest').status_code
+    first_data = time.perf_counter()
+    return {
+        'import': imported - started,
+        'first_response': first_response - imported,
+        'first_data': first_data - first_response,
+        'spawn_to_first_response': spawn_to_first_response,
+        'status': [status, data_status],
+        'psycopg2_loaded': 'psycopg2' in sys.modules,
+    }
+
+
+def store_env(args, store, workdir):
+    env = dict(os.environ)
+    env['DB_JOURNAL_PATH'] = os.path.join(workdir, 'journal.bin')
+    env.update(args.env)
+    if store == 'postgres':
+        env.update({
+            'DB_HOST': args.pg_host,
+            'DB_PORT': str(args.pg_port),
+            'DB_NAME': args.pg_db,
+            'DB_USER': args.pg_user,
+            'DB_PASSWORD': args.pg_password,
+        })
+    elif store == 'unreachable':
+        # Endereço sem resposta: mede o custo do connect_timeout no 1.º pedido
+        env.update({'DB_HOST': args.unreachable_host, 'DB_PORT': '5432'})
+    else:
+        env.update({'DB_HOST': '127.0.0.1', 'DB_PORT': '9', 'STORAGE_ENGINE': store,
+                    'SQLITE_PATH': os.path.join(workdir, 'startup.db')})
+    return env
+
+
+def summarize(samples):
+    summary = {}
+    for phase in PHASES:
+        values = sorted(s[phase] * 1000 for s in samples)
+        summary[phase] = {
+            'min': round(values[0], 3),
+            'p50': round(percentile(values, 0.50), 3),
+            'max': round(values[-1], 3),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tempo de arranque a frio da API do Radar DIY')
+    parser.add_argument('--stores', nargs='+', choices=STORES, default=['memory', 'sqlite', 'unreachable', 'postgres'])
+    parser.add_argument('--runs', type=int, default=5, help='processos por cenário')
+    parser.add_argument('--unreachable-host', default='10.255.255.1')
+    parser.add_argument('--pg-host', default=None)
+    parser.add_argument('--pg-port', type=int, default=5432)
+    parser.add_argument('--pg-db', default='postgres')
+    parser.add_argument('--pg-user', default='postgres')
+    parser.add_argument('--pg-password', default='')
+    parser.add_argument('--set', dest='env', action='append', default=[], metavar='VAR=VALOR',
+                        help='variável de ambiente extra para a app (repetível)')
+    parser.add_argument('--out', default=None, help='ficheiro JSON de saída (padrão: stdout)')
+    parser.add_argument('--worker', type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_worker(args.worker)))
+        return
+
+    args.env = dict(item.split('=', 1) for item in args.env)
+    workdir = tempfile.mkdtemp(prefix='radar-startup-')
+    results = []
+    for store in args.stores:
+        if store == 'postgres' and not args.pg_host:
+            results.append({'store': store, 'skipped': 'sem --pg-host'})
+            continue
+        print(f'▶ {store}', file=sys.stderr)
+        samples, error = [], None
+        for _ in range(args.runs):
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', repr(time.time())],
+                env=store_env(args, store, workdir), cwd=ROOT, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                error = proc.stderr.strip()[-2000:]
+                break
+            samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if error:
+            results.append({'store': store, 'error': error})
+            continue
+        results.append({
+            'store': store,
+            'runs': len(samples),
+            'ms': summarize(samples),
+            'status': samples[-1]['status'],
+            'psycopg2_loaded': samples[-1]['psycopg2_loaded'],
+        })
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'env': args.env,
+        'scenarios': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
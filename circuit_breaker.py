@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Circuit breaker para um recurso remoto (aqui, o PostgreSQL).
+
+    - closed: as chamadas passam; ``failure_threshold`` falhas seguidas abrem-no;
+    - open: as chamadas são recusadas de imediato durante o backoff atual;
+    - half_open: terminado o backoff, uma única chamada de teste passa. Se
+      funcionar, o circuito fecha; se falhar, reabre com o dobro do backoff
+      (até ``max_reset_timeout``).
+
+    ``on_close`` é chamado (fora do lock) sempre que o circuito volta a fechar.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=1.0, max_reset_timeout=30.0,
+                 on_close=None):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.on_close = on_close
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._backoff = reset_timeout
+        self._retry_at = 0.0
+        self._counters = {
+            'opened': 0,
+            'probes': 0,
+            'rejected': 0,
+        }
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        """True se a chamada pode tentar o recurso agora."""
+        if self._state == CLOSED:
+            return True
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = time.monotonic()
+            # Em half_open a sonda ainda não respondeu: outra só após novo backoff
+            if now >= self._retry_at:
+                self._state = HALF_OPEN
+                self._retry_at = now + self._backoff
+                self._counters['probes'] += 1
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def record_success(self):
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            reopened = self._state != CLOSED
+            self._state = CLOSED
+            self._failures = 0
+            self._backoff = self.reset_timeout
+        if reopened:
+            logger.info("✅ Circuito fechado: PostgreSQL de volta")
+            if self.on_close is not None:
+                self.on_close()
+
+    def record_failure(self, trip=False):
+        """Regista uma falha; ``trip`` abre o circuito sem esperar pelo limite."""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._backoff = min(self._backoff * 2, self.max_reset_timeout)
+                self._open_locked()
+            elif self._state == CLOSED and (trip or self._failures >= self.failure_threshold):
+                self._backoff = self.reset_timeout
+                self._open_locked()
+                logger.warning(f"⚠️ Circuito aberto após {self._failures} falha(s) do PostgreSQL")
+
+    def _open_locked(self):
+        self._state = OPEN
+        self._retry_at = time.monotonic() + self._backoff
+        self._counters['opened'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'failures': self._failures,
+                'backoff': self._backoff,
+                'retry_in': max(0.0, round(self._retry_at - time.monotonic(), 3)) if self._state != CLOSED else 0.0,
+                **self._counters,
+            }
@@ -0,0 +1,14 @@
+"""Configuração do PostgreSQL partilhada pelo servidor (index.py) e pela CLI
+de retenção, sem importar a aplicação Flask."""
+import os
+
+# SUAS CREDENCIAIS POSTGRESQL
+DB_CONFIG = {
+    "host": os.environ.get('DB_HOST', 'aid.estgoh.ipc.pt'),
+    "database": os.environ.get('DB_NAME', 'db2022145941'), 
+    "user": os.environ.get('DB_USER', 'a2022145941'),
+    "password": os.environ.get('DB_PASSWORD', '1234567890'),
+    "port": int(os.environ.get('DB_PORT', 5432)),
+    # Servidor inacessível não pode prender um pedido pelo timeout TCP do SO
+    "connect_timeout": int(os.environ.get('DB_CONNECT_TIMEOUT', 3))
+}
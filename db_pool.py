@@ -0,0 +1,280 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """Conexão emprestada pelo pool; close() devolve-a em vez de a fechar."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        if self._entry is None:
+            raise AttributeError(f"conexão já devolvida ao pool: {name}")
+        return getattr(self._entry.conn, name)
+
+    def cursor(self, *args, **kwargs):
+        if self._entry is None:
+            raise AttributeError("conexão já devolvida ao pool: cursor")
+        cur = self._entry.conn.cursor(*args, **kwargs)
+        if self._pool.wrap_cursor is not None:
+            cur = self._pool.wrap_cursor(cur)
+        return cur
+
+    @property
+    def raw(self):
+        return self._entry.conn if self._entry else None
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry)
+
+    def discard(self):
+        # Fecha de verdade (ex: conexão em estado inválido)
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Pool limitado de conexões com verificação de vida, expiração por
+    inatividade e reciclagem por tempo máximo de vida."""
+
+    def __init__(self, connect, maxsize=10, minsize=0, idle_timeout=300.0,
+                 max_lifetime=1800.0, checkout_timeout=5.0, ping_after=30.0,
+                 wrap_cursor=None):
+        if maxsize < 1:
+            raise ValueError("maxsize deve ser >= 1")
+        self._connect = connect
+        self.maxsize = maxsize
+        self.minsize = min(minsize, maxsize)
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self.wrap_cursor = wrap_cursor  # ex: instrumentação dos cursores
+
+        self._cond = threading.Condition()
+        self._idle = []  # LIFO: a conexão mais "quente" sai primeiro
+        self._size = 0
+        self._closed = False
+        self._last_reap = time.monotonic()
+        self._counters = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connect_errors': 0,
+            'failed_pings': 0,
+            'evicted_idle': 0,
+            'recycled': 0,
+        }
+
+    # --- API pública -----------------------------------------------------
+
+    def getconn(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise PoolExhausted("pool fechado")
+                self._maybe_reap_locked()
+                waited = False
+                while True:
+                    entry = self._pop_idle_locked()
+                    if entry is not None:
+                        break
+                    if self._size < self.maxsize:
+                        self._size += 1  # reserva o lugar; conecta fora do lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolExhausted(
+                            f"nenhuma conexão livre após {timeout:.1f}s "
+                            f"(max={self.maxsize})")
+                    if not waited:
+                        self._counters['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                entry = self._open()
+            elif not self._is_alive(entry):
+                self._close_entry(entry)
+                continue
+
+            entry.last_used = time.monotonic()
+            with self._cond:
+                self._counters['checkouts'] += 1
+            return PooledConnection(self, entry)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'maxsize': self.maxsize,
+                'minsize': self.minsize,
+                **self._counters,
+            }
+
+    def reap(self):
+        with self._cond:
+            self._reap_locked()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_entry(entry)
+
+    # --- internos --------------------------------------------------------
+
+    def _open(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._counters['connect_errors'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters['created'] += 1
+        return _Entry(conn)
+
+    def _release(self, entry, discard=False):
+        conn = entry.conn
+        if not discard and not getattr(conn, 'closed', False):
+            try:
+                # Não devolver transações abertas/abortadas ao pool
+                if conn.get_transaction_status() != 0:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if not discard and getattr(conn, 'closed', False):
+            discard = True
+        if not discard and self._expired(entry, time.monotonic()):
+            discard = True
+            with self._cond:
+                self._counters['recycled'] += 1
+
+        if discard:
+            self._close_entry(entry)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            if self._closed:
+                discard = True
+            else:
+                self._idle.append(entry)
+                self._cond.notify()
+        if discard:
+            self._close_entry(entry)
+
+    def _close_entry(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._counters['closed'] += 1
+            self._cond.notify()
+
+    def _pop_idle_locked(self):
+        now = time.monotonic()
+        while self._idle:
+            entry = self._idle.pop()
+            if self._expired(entry, now):
+                self._counters['recycled'] += 1
+                self._discard_locked(entry)
+                continue
+            return entry
+        return None
+
+    def _discard_locked(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        self._size -= 1
+        self._counters['closed'] += 1
+
+    def _expired(self, entry, now):
+        return bool(self.max_lifetime) and now - entry.created_at >= self.max_lifetime
+
+    def _is_alive(self, entry):
+        conn = entry.conn
+        if getattr(conn, 'closed', False):
+            return False
+        if time.monotonic() - entry.last_used < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Conexão do pool morta, descartando: {e}")
+            with self._cond:
+                self._counters['failed_pings'] += 1
+            return False
+
+    def _maybe_reap_locked(self):
+        if self.idle_timeout and time.monotonic() - self._last_reap >= self.idle_timeout / 2:
+            self._reap_locked()
+
+    def _reap_locked(self):
+        now = time.monotonic()
+        self._last_reap = now
+        keep = []
+        # _idle está ordenado do mais antigo para o mais recente
+        for i, entry in enumerate(self._idle):
+            removable = len(self._idle) - i + len(keep) > self.minsize
+            idle_too_long = self.idle_timeout and now - entry.last_used >= self.idle_timeout
+            if removable and (idle_too_long or self._expired(entry, now)):
+                if idle_too_long:
+                    self._counters['evicted_idle'] += 1
+                else:
+                    self._counters['recycled'] += 1
+                self._discard_locked(entry)
+            else:
+                keep.append(entry)
+        self._idle = keep
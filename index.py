@@ -1,454 +1,795 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+import atexit
+import csv
+import io
+import json
+import math
 import os
+import sys
+import tempfile
+import threading
+import time
 
-app = Flask(__name__)
+from aggregate import parse_bucket, parse_time
+from circuit_breaker import CircuitBreaker
+from config import DB_CONFIG
+from db_pool import ConnectionPool, PoolExhausted
+from journal import JournalFull, SpillJournal
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, TimedCursor
+from pubsub import PubSubHub
+from radar_protocol import FrameError, decode_frame, frame_readings
+from response_cache import ResponseCache
+from retention import RetentionWorker
+from storage import (EXPORT_COLUMNS, DeviceLimitExceeded, MemoryEngine, PostgresEngine, SharedMemoryEngine,
+                     SQLiteEngine, StorageUnavailable)
+from static_assets import AssetBundle, compress, compress_stream, negotiate
+from sweep import SweepSnapshot
+from tracking import ObjectTracker
+from write_behind import QueueFull, WriteBehindQueue
+
+# /static é servido por static_file() (nomes com hash, gzip/brotli, ETag)
+app = Flask(__name__, static_folder=None)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# SUAS CREDENCIAIS POSTGRESQL
-DB_CONFIG = {
-    "host": os.environ.get('DB_HOST', 'aid.estgoh.ipc.pt'),
-    "database": os.environ.get('DB_NAME', 'db2022145941'), 
-    "user": os.environ.get('DB_USER', 'a2022145941'),
-    "password": os.environ.get('DB_PASSWORD', '1234567890'),
-    "port": int(os.environ.get('DB_PORT', 5432))
+# Conexão preguiçosa: o primeiro pedido que precisa do PostgreSQL conecta e
+# verifica o schema. DB_WARMUP=1 faz isso numa thread logo no arranque (não
+# usar com fork/preload)
+DB_WARMUP = os.environ.get('DB_WARMUP', '0') == '1'
+
+# Circuit breaker: após DB_BREAKER_THRESHOLD falhas de conexão seguidas os
+# pedidos deixam de esperar pelo PostgreSQL; nova tentativa após um backoff
+# exponencial de DB_BREAKER_RESET até DB_RETRY_INTERVAL segundos
+DB_BREAKER_THRESHOLD = int(os.environ.get('DB_BREAKER_THRESHOLD', 3))
+DB_BREAKER_RESET = float(os.environ.get('DB_BREAKER_RESET', 1))
+DB_RETRY_INTERVAL = float(os.environ.get('DB_RETRY_INTERVAL', 30))
+
+# Journal: leituras recebidas com o circuito aberto, reenviadas em lotes
+# quando o PostgreSQL volta ('' = journal em memória)
+DB_JOURNAL_PATH = os.environ.get('DB_JOURNAL_PATH', 'radar-journal.bin')
+DB_JOURNAL_MAX_ROWS = int(os.environ.get('DB_JOURNAL_MAX_ROWS', 100000))
+DB_JOURNAL_FSYNC = os.environ.get('DB_JOURNAL_FSYNC', '0') == '1'
+DB_JOURNAL_REPLAY_BATCH = int(os.environ.get('DB_JOURNAL_REPLAY_BATCH', 1000))
+
+# Engine de armazenamento: 'postgresql' (com o engine local como recurso
+# quando o servidor não responde), 'sqlite', 'memory' ou 'shared' (sem PostgreSQL)
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'postgresql')
+# Engine local: 'memory' (buffer circular, volátil), 'shared' (buffer circular
+# partilhado pelos workers) ou 'sqlite' (ficheiro, WAL)
+STORAGE_FALLBACK = os.environ.get('STORAGE_FALLBACK', 'memory')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'radar.db')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# Schema: particionamento diário opcional de radar_data
+DB_PARTITIONED = os.environ.get('DB_PARTITIONED', '0') == '1'
+DB_PARTITION_DAYS_AHEAD = int(os.environ.get('DB_PARTITION_DAYS_AHEAD', 3))
+DB_PARTITION_RETENTION_DAYS = int(os.environ.get('DB_PARTITION_RETENTION_DAYS', 0))  # 0 = manter tudo
+
+# Pool de conexões (reaproveita conexões em vez de um handshake por request)
+DB_POOL_CONFIG = {
+    "minsize": int(os.environ.get('DB_POOL_MIN', 0)),
+    "maxsize": int(os.environ.get('DB_POOL_MAX', 10)),
+    "idle_timeout": float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+    "max_lifetime": float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+    "checkout_timeout": float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+}
+
+# Capacidade do buffer em memória (leituras por dispositivo, engine 'memory',
+# alocadas conforme chegam) e máximo de dispositivos: a memória fica limitada a
+# MEMORY_MAX_DEVICES * MEMORY_CAPACITY leituras; dispositivos novos além disso
+# são recusados (507)
+MEMORY_CAPACITY = int(os.environ.get('MEMORY_CAPACITY', 100000))
+MEMORY_MAX_DEVICES = int(os.environ.get('MEMORY_MAX_DEVICES', 16))
+
+# Buffer partilhado (engine 'shared'): ficheiro mapeado em memória, de
+# preferência em /dev/shm (RAM), e capacidade total (32 bytes por leitura)
+SHARED_MEMORY_PATH = os.environ.get('SHARED_MEMORY_PATH', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'radar-ring'))
+SHARED_MEMORY_CAPACITY = int(os.environ.get('SHARED_MEMORY_CAPACITY', 1000000))
+
+# Dispositivos: device_id vai de 0 (radar único, o padrão) ao máximo do
+# protocolo binário (u16); /api/devices mede a taxa de ingestão nesta janela
+DEVICE_ID_MAX = 0xFFFF
+DEVICE_RATE_WINDOW = float(os.environ.get('DEVICE_RATE_WINDOW', 60))
+
+# Ingestão em lote
+BATCH_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', 5000))
+BATCH_PAGE_SIZE = 1000
+INT_MAX = 2**31 - 1
+
+# Sincronização incremental (GET /api/radar/data?since=<cursor>&limit=N)
+SYNC_DEFAULT_LIMIT = 100
+SYNC_MAX_LIMIT = int(os.environ.get('SYNC_MAX_LIMIT', 1000))
+SYNC_LATEST = 'latest'
+BIGINT_MAX = 2**63 - 1
+
+# Escrita assíncrona (write-behind): POSTs respondem 202 e uma thread grava em lotes
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_CONFIG = {
+    "maxsize": int(os.environ.get('WRITE_BEHIND_MAX', 10000)),
+    "batch_size": int(os.environ.get('WRITE_BEHIND_BATCH', 500)),
+    "flush_interval": float(os.environ.get('WRITE_BEHIND_INTERVAL', 1.0)),
+    "put_timeout": float(os.environ.get('WRITE_BEHIND_PUT_TIMEOUT', 0)),
+}
+
+# Server-Sent Events (/api/radar/stream)
+SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 256))
+SSE_HISTORY = int(os.environ.get('SSE_HISTORY', 1024))
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+# Duração máxima de uma ligação (0 = sem limite): abaixo do tempo máximo de
+# uma função serverless (vercel.json), o stream termina limpo e o
+# EventSource volta a ligar com o Last-Event-ID
+SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', 25))
+SSE_RETRY_MS = 3000
+
+# Varrimento atual por ângulo (/api/radar/sweep)
+SWEEP_RESOLUTION = int(os.environ.get('SWEEP_RESOLUTION', 5))
+SWEEP_MAX_ANGLE = int(os.environ.get('SWEEP_MAX_ANGLE', 180))
+SWEEP_SEED_ROWS = 1000
+
+# Deteção e seguimento de objetos por varrimento (/api/radar/objects)
+TRACKING = os.environ.get('TRACKING', '1') == '1'
+TRACKING_CONFIG = {
+    "max_range": float(os.environ.get('TRACKING_MAX_RANGE', 250)),
+    "gap": float(os.environ.get('TRACKING_GAP', 20)),
+    "match_distance": float(os.environ.get('TRACKING_MATCH_DISTANCE', 50)),
+    "max_missed": int(os.environ.get('TRACKING_MAX_MISSED', 2)),
+    "alert_distance": float(os.environ.get('TRACKING_ALERT_DISTANCE', 30)),
 }
 
+# Agregação por intervalos de tempo (/api/radar/aggregate)
+AGGREGATE_MAX_BUCKETS = int(os.environ.get('AGGREGATE_MAX_BUCKETS', 2000))
+
+# Exportação em stream (/api/radar/export): linhas por página lida da base
+EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 2000))
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Cache das respostas de leitura (invalidado a cada escrita deste processo)
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 2))
+
+# Dashboard em static/ (HTML, CSS e JS, gráficos incluídos: sem CDN)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Respostas JSON a partir deste tamanho (bytes) são comprimidas se o cliente
+# aceitar gzip/brotli (0 = nunca)
+JSON_COMPRESS_MIN_SIZE = int(os.environ.get('JSON_COMPRESS_MIN_SIZE', 1024))
+
+# Retenção: leituras brutas mais antigas que RETENTION_RAW_HOURS passam a
+# resumos por minuto/ângulo (radar_data_minute). 0 = desativado
+RETENTION_RAW_HOURS = float(os.environ.get('RETENTION_RAW_HOURS', 0))
+RETENTION_SUMMARY_DAYS = float(os.environ.get('RETENTION_SUMMARY_DAYS', 0))  # 0 = manter resumos
+RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL', 3600))
+RETENTION_CHUNK = int(os.environ.get('RETENTION_CHUNK', 5000))
+
 # Sistema híbrido
 USE_POSTGRESQL = False
-radar_data = []  # Backup em memória
+hub = PubSubHub(SSE_BUFFER_SIZE, SSE_HISTORY)
+sweep = SweepSnapshot(SWEEP_RESOLUTION, SWEEP_MAX_ANGLE)
+sweeps_seeded = set()  # device_id (None = todos) cujo varrimento já veio da base
+device_sweeps = {}  # device_id -> SweepSnapshot só desse dispositivo
+device_hubs = {}  # device_id -> PubSubHub de quem segue só esse dispositivo
+device_trackers = {}  # device_id -> ObjectTracker
+_device_lock = threading.Lock()
+response_cache = ResponseCache(RESPONSE_CACHE_TTL)
+dashboard_assets = AssetBundle(STATIC_DIR)
+last_sweep_seq = {}  # device_id -> último sweep_seq recebido em /api/radar/frame
+_frame_lock = threading.Lock()
+db_pool = None
+_db_pool_lock = threading.Lock()
 
-# Tentar conectar com PostgreSQL usando psycopg2
-def get_db_connection():
+# Métricas no formato Prometheus (/api/metrics)
+metrics_registry = Registry()
+http_requests = metrics_registry.counter(
+    'radar_http_requests_total', 'Pedidos HTTP por rota, método e estado', ('route', 'method', 'status'))
+http_latency = metrics_registry.histogram(
+    'radar_http_request_duration_seconds', 'Latência dos pedidos HTTP', ('route', 'method'))
+http_exceptions = metrics_registry.counter(
+    'radar_http_exceptions_total', 'Exceções não tratadas por rota', ('route',))
+db_connect_seconds = metrics_registry.histogram(
+    'radar_db_connect_seconds', 'Duração das conexões novas ao PostgreSQL')
+db_connect_errors = metrics_registry.counter(
+    'radar_db_connect_errors_total', 'Falhas ao conectar ao PostgreSQL')
+db_query_seconds = metrics_registry.histogram(
+    'radar_db_query_seconds', 'Duração das queries por tipo de SQL', ('operation',))
+db_query_errors = metrics_registry.counter(
+    'radar_db_query_errors_total', 'Queries que falharam por tipo de SQL', ('operation',))
+json_encode_seconds = metrics_registry.histogram(
+    'radar_json_encode_seconds', 'Construção e serialização das respostas JSON em cache', ('key',))
+compress_seconds = metrics_registry.histogram(
+    'radar_response_compress_seconds', 'Compressão das respostas JSON por codificação', ('encoding',))
+readings_ingested = metrics_registry.counter(
+    'radar_readings_ingested_total', 'Leituras aceites (gravadas ou enfileiradas)')
+readings_rejected = metrics_registry.counter(
+    'radar_readings_rejected_total', 'Leituras rejeitadas na validação', ('route',))
+metrics_registry.gauge('radar_database_up', 'PostgreSQL em uso (1) ou modo em memória (0)',
+                       lambda: int(USE_POSTGRESQL))
+metrics_registry.gauge_group([
+    ('radar_local_readings', 'Leituras no engine local (memória ou SQLite)', 'size'),
+    ('radar_local_bytes', 'Bytes ocupados pelo engine local', 'bytes'),
+    ('radar_local_dropped', 'Leituras descartadas por lotes maiores que o buffer partilhado', 'dropped'),
+], lambda: local_store.stats())
+metrics_registry.gauge('radar_db_pool_size', 'Conexões abertas no pool',
+                       lambda: db_pool.stats()['size'] if db_pool else None)
+metrics_registry.gauge('radar_db_pool_in_use', 'Conexões emprestadas do pool',
+                       lambda: db_pool.stats()['in_use'] if db_pool else None)
+metrics_registry.gauge('radar_write_behind_depth', 'Lotes à espera na fila write-behind',
+                       lambda: write_behind.stats()['depth'] if write_behind is not None else None)
+metrics_registry.gauge('radar_db_breaker_open', 'Circuit breaker do PostgreSQL aberto (1) ou fechado (0)',
+                       lambda: int(db_breaker.state != 'closed'))
+metrics_registry.gauge('radar_journal_pending', 'Leituras no journal à espera de replay',
+                       lambda: journal.stats()['pending'])
+metrics_registry.gauge('radar_stream_subscribers', 'Clientes ligados a /api/radar/stream',
+                       lambda: hub.stats()['subscribers'] + sum(
+                           h.stats()['subscribers'] for _, h in device_states(device_hubs)))
+
+# psycopg2 só é importado na primeira conexão: quem usa o engine local
+# (ou só serve o dashboard) não paga esse import no arranque
+def _connect_postgresql():
+    import psycopg2
+    started = time.perf_counter()
     try:
-        import psycopg2
         conn = psycopg2.connect(**DB_CONFIG)
-        global USE_POSTGRESQL
-        USE_POSTGRESQL = True
-        logger.info("✅ Conectado ao PostgreSQL via psycopg2")
-        return conn
+    except Exception:
+        db_connect_errors.inc()
+        raise
+    finally:
+        db_connect_seconds.observe(time.perf_counter() - started)
+    logger.info("✅ Conectado ao PostgreSQL via psycopg2")
+    return conn
+
+def _timed_cursor(cur):
+    return TimedCursor(cur, db_query_seconds, db_query_errors)
+
+def get_pool():
+    global db_pool
+    if db_pool is None:
+        with _db_pool_lock:
+            if db_pool is None:
+                db_pool = ConnectionPool(_connect_postgresql, wrap_cursor=_timed_cursor, **DB_POOL_CONFIG)
+    return db_pool
+
+# Obter conexão do pool (close() devolve a conexão ao pool). Pool esgotado
+# não é o servidor em baixo: PoolExhausted segue para quem chamou
+def get_db_connection():
+    try:
+        return get_pool().getconn()
+    except PoolExhausted:
+        raise
     except Exception as e:
         logger.warning(f"⚠️ PostgreSQL não disponível: {e}")
-        logger.info("🔄 Usando modo em memória")
+        logger.info(f"🔄 Usando modo {local_store.name}")
         return None
 
-# Inicialização segura
-def safe_init():
+# Engines: PostgreSQL (pelo pool) e o engine local usado sem servidor
+def create_local_store():
+    name = STORAGE_ENGINE if STORAGE_ENGINE != 'postgresql' else STORAGE_FALLBACK
+    if name == 'sqlite':
+        return SQLiteEngine(SQLITE_PATH, synchronous=SQLITE_SYNCHRONOUS)
+    if name == 'shared':
+        return SharedMemoryEngine(SHARED_MEMORY_PATH, SHARED_MEMORY_CAPACITY)
+    if name != 'memory':
+        raise ValueError(f"Engine de armazenamento desconhecido: {name!r}")
+    return MemoryEngine(MEMORY_CAPACITY, MEMORY_MAX_DEVICES)
+
+pg_store = PostgresEngine(get_db_connection, DB_PARTITION_DAYS_AHEAD,
+                          DB_PARTITION_RETENTION_DAYS, BATCH_PAGE_SIZE)
+local_store = create_local_store()
+
+# Falha de conexão (servidor em baixo, rede, conexão cortada) e não um erro
+# de SQL: só estas contam para o circuit breaker
+def is_connection_error(error):
+    if isinstance(error, StorageUnavailable):
+        return True
+    psycopg2 = sys.modules.get('psycopg2')
+    if psycopg2 is None:
+        return False
+    if isinstance(error, psycopg2.InterfaceError):
+        return True
+    return isinstance(error, psycopg2.OperationalError) and error.pgcode is None
+
+# Reenviar o journal ao PostgreSQL em lotes (uma thread de cada vez)
+_replay_lock = threading.Lock()
+
+def replay_journal():
+    if not _replay_lock.acquire(blocking=False):
+        return
     try:
-        logger.info("🔄 Tentando conectar com PostgreSQL...")
-        conn = get_db_connection()
-        if conn:
+        while journal.pending:
+            batch = journal.peek(DB_JOURNAL_REPLAY_BATCH)
             try:
-                cur = conn.cursor()
-                cur.execute('''
-                    CREATE TABLE IF NOT EXISTS radar_data (
-                        id SERIAL PRIMARY KEY,
-                        angle INTEGER NOT NULL,
-                        distance INTEGER NOT NULL,
-                        timestamp BIGINT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                conn.commit()
-                cur.close()
-                conn.close()
-                logger.info("✅ Tabela PostgreSQL pronta")
+                call_database(lambda store: store.restore(batch))
+            except PoolExhausted:
+                time.sleep(1)  # conexões ocupadas: tentar de novo
+                continue
             except Exception as e:
-                logger.warning(f"⚠️ Erro ao criar tabela: {e}")
+                logger.warning(f"⚠️ Replay do journal interrompido: {e}")
+                return
+            journal.commit(len(batch))
+            response_cache.invalidate()
+            logger.info(f"📼 Journal: {len(batch)} leituras reenviadas, {journal.pending} por reenviar")
+    finally:
+        _replay_lock.release()
+
+def start_journal_replay():
+    if journal.pending:
+        threading.Thread(target=replay_journal, name='journal-replay', daemon=True).start()
+
+db_breaker = CircuitBreaker(DB_BREAKER_THRESHOLD, DB_BREAKER_RESET, DB_RETRY_INTERVAL,
+                            on_close=start_journal_replay)
+journal = SpillJournal(DB_JOURNAL_PATH, DB_JOURNAL_MAX_ROWS, DB_JOURNAL_FSYNC)
+
+# Inicialização preguiçosa: conectar e aplicar as migrações em falta na
+# primeira utilização, uma vez por processo. Pedidos simultâneos esperam
+# pela mesma tentativa (no máximo connect_timeout) em vez de repeti-la;
+# sem servidor, o circuito abre e as novas tentativas seguem o seu backoff.
+db_ready = False
+_db_init_lock = threading.Lock()
+
+def ensure_database():
+    global db_ready, USE_POSTGRESQL
+    if db_ready:
+        return True
+    if STORAGE_ENGINE != 'postgresql' or not db_breaker.allow():
+        return False
+    with _db_init_lock:
+        if db_ready or db_breaker.state == 'open':
+            return db_ready
+        try:
+            logger.info("🔄 Tentando conectar com PostgreSQL...")
+            applied = pg_store.migrate(partitioned=DB_PARTITIONED)
+            if applied:
+                logger.info(f"✅ Migrações aplicadas: {applied}")
+            logger.info("✅ Tabela PostgreSQL pronta")
+            db_ready = USE_POSTGRESQL = True
+        except StorageUnavailable:
+            logger.info(f"🔧 Modo {local_store.name} ativado")
+        except PoolExhausted:
+            raise  # o servidor responde: não abrir o circuito
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao migrar schema: {e}")
+        if db_ready:
+            db_breaker.record_success()
         else:
-            logger.info("🔧 Modo em memória ativado")
+            db_breaker.record_failure(trip=True)
+    if db_ready:
+        start_journal_replay()
+    return db_ready
+
+# Operação no PostgreSQL protegida pelo circuit breaker: com o circuito
+# aberto falha logo (StorageUnavailable) em vez de esperar por um connect
+def call_database(operation):
+    if not db_breaker.allow():
+        raise StorageUnavailable('PostgreSQL indisponível (circuito aberto)')
+    try:
+        result = operation(pg_store)
+    except PoolExhausted:
+        raise  # carga local: não conta para o circuito
     except Exception as e:
-        logger.error(f"❌ Erro na inicialização: {e}")
+        if not is_connection_error(e):
+            db_breaker.record_success()  # o servidor respondeu
+            raise
+        db_breaker.record_failure()
+        if isinstance(e, StorageUnavailable):
+            raise
+        raise StorageUnavailable(str(e)) from e
+    db_breaker.record_success()
+    return result
+
+# Executar uma operação no PostgreSQL ou, sem conexão, no engine local.
+# Escritas passam ``spill``: o que fazer com os dados enquanto o servidor
+# não responde (o journal), em vez de os deixar só no engine local. Também
+# quando o PostgreSQL ainda nunca respondeu neste processo (arranque durante
+# a falha): o replay corre na primeira conexão
+def with_storage(operation, spill=None):
+    if ensure_database():
+        try:
+            return call_database(operation)
+        except StorageUnavailable:
+            if spill is not None:
+                return spill()
+    elif spill is not None and STORAGE_ENGINE == 'postgresql':
+        return spill()
+    return operation(local_store)
+
+logger.info(f"🔄 Iniciando Radar DIY (engine {STORAGE_ENGINE})...")
+if DB_WARMUP and STORAGE_ENGINE == 'postgresql':
+    threading.Thread(target=ensure_database, name='db-warmup', daemon=True).start()
+
+# Retenção em segundo plano: agrega leituras antigas por minuto e apaga-as
+# (no SQLite apenas as apaga; o buffer em memória já é limitado)
+def retention_job():
+    summary_keep = timedelta(days=RETENTION_SUMMARY_DAYS) if RETENTION_SUMMARY_DAYS > 0 else None
+    result = with_storage(lambda store: store.retain(
+        timedelta(hours=RETENTION_RAW_HOURS), RETENTION_CHUNK, summary_keep))
+    if result is not None:
+        response_cache.invalidate()
+    return result
+
+retention_worker = None
+if RETENTION_RAW_HOURS > 0:
+    retention_worker = RetentionWorker(retention_job, RETENTION_INTERVAL)
+    logger.info(f"🧹 Retenção ativada: {RETENTION_RAW_HOURS}h de leituras brutas")
+
+write_behind = None
+if WRITE_BEHIND:
+    write_behind = WriteBehindQueue(lambda rows: save_readings(rows), **WRITE_BEHIND_CONFIG)
+    atexit.register(write_behind.close)
+    logger.info("📥 Modo write-behind ativado")
+
+# Latência e contagem por rota (a regra do Flask, não o URL, para não
+# multiplicar as séries com query strings ou ids)
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# Inicializar
-logger.info("🔄 Iniciando Radar DIY...")
-safe_init()
+# Threads de fundo só arrancam com o primeiro pedido (não no import, que
+# pode acontecer antes de um fork do servidor)
+@app.before_request
+def start_background_jobs():
+    if retention_worker is not None:
+        retention_worker.start()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = _route_label()
+        http_latency.observe(time.perf_counter() - started, route, request.method)
+        http_requests.inc(1, route, request.method, str(response.status_code))
+    return response
+
+# JSON grande comprimido conforme o Accept-Encoding (as respostas do cache
+# já trazem a variante comprimida guardada na entrada). Registado depois das
+# métricas para correr antes delas e contar na latência
+@app.after_request
+def compress_json_response(response):
+    if (not JSON_COMPRESS_MIN_SIZE or response.status_code != 200
+            or response.mimetype != 'application/json' or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < JSON_COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    with compress_seconds.time(encoding):
+        response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+@app.teardown_request
+def record_request_exception(error):
+    if error is not None:
+        http_exceptions.inc(1, _route_label())
 
 @app.route('/')
 def home():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Radar DIY - Sistema Online</title>
-        <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { 
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh; 
-                padding: 20px;
-            }
-            .container { 
-                max-width: 1200px; 
-                margin: 0 auto;
-            }
-            .header { 
-                text-align: center; 
-                color: white; 
-                margin-bottom: 30px;
-                text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-            }
-            .header h1 {
-                font-size: 2.5rem;
-                margin-bottom: 10px;
-            }
-            .card { 
-                background: white; 
-                padding: 25px; 
-                margin: 20px 0; 
-                border-radius: 15px; 
-                box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-            }
-            .card h2 { 
-                color: #333; 
-                margin-bottom: 20px;
-                border-bottom: 2px solid #667eea;
-                padding-bottom: 10px;
-            }
-            .status-container {
-                display: grid;
-                grid-template-columns: 1fr 1fr 1fr;
-                gap: 15px;
-                margin-bottom: 20px;
-            }
-            .status { 
-                padding: 20px; 
-                border-radius: 10px; 
-                text-align: center; 
-                font-weight: bold;
-                font-size: 1.1rem;
-            }
-            .online { background: #d4edda; color: #155724; border: 2px solid #c3e6cb; }
-            .offline { background: #f8d7da; color: #721c24; border: 2px solid #f5c6cb; }
-            .connecting { background: #fff3cd; color: #856404; border: 2px solid #ffeaa7; }
-            .charts-container {
-                display: grid;
-                grid-template-columns: 1fr 1fr;
-                gap: 20px;
-            }
-            .chart-wrapper {
-                background: #f8f9fa;
-                padding: 20px;
-                border-radius: 10px;
-            }
-            .data-table {
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 15px;
-            }
-            .data-table th, .data-table td {
-                padding: 12px;
-                text-align: center;
-                border-bottom: 1px solid #dee2e6;
-            }
-            .data-table th {
-                background: #667eea;
-                color: white;
-            }
-            .controls {
-                display: flex;
-                gap: 10px;
-                margin-top: 15px;
-            }
-            button {
-                padding: 12px 24px;
-                border: none;
-                border-radius: 8px;
-                background: #667eea;
-                color: white;
-                font-weight: bold;
-                cursor: pointer;
-                transition: all 0.3s;
-            }
-            button:hover {
-                background: #5a6fd8;
-                transform: translateY(-2px);
-            }
-            @media (max-width: 768px) {
-                .status-container, .charts-container {
-                    grid-template-columns: 1fr;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🚨 Radar DIY - Sistema Online</h1>
-                <p>Monitoramento em tempo real com Arduino e PostgreSQL</p>
-            </div>
-            
-            <div class="card">
-                <h2>📊 Status do Sistema</h2>
-                <div class="status-container">
-                    <div id="radarStatus" class="status offline">
-                        <div>📡 Radar</div>
-                        <div>Aguardando dados...</div>
-                    </div>
-                    <div id="dbStatus" class="status offline">
-                        <div>🗄️ Banco de Dados</div>
-                        <div>Testando conexão...</div>
-                    </div>
-                    <div id="ledStatus" class="status offline">
-                        <div>💡 LED RGB</div>
-                        <div>Desconhecido</div>
-                    </div>
-                </div>
-                <div id="lastUpdate" style="text-align: center; margin-top: 15px; font-style: italic; color: #666;">
-                    Última atualização: Nunca
-                </div>
-            </div>
-
-            <div class="card">
-                <h2>📈 Visualizações</h2>
-                <div class="charts-container">
-                    <div class="chart-wrapper">
-                        <h3>🌐 Visualização Radar</h3>
-                        <canvas id="radarChart" width="400" height="400"></canvas>
-                    </div>
-                    <div class="chart-wrapper">
-                        <h3>📏 Distância em Tempo Real</h3>
-                        <canvas id="distanceChart" width="400" height="400"></canvas>
-                    </div>
-                </div>
-            </div>
-
-            <div class="card">
-                <h2>📋 Últimas Leituras</h2>
-                <div style="max-height: 300px; overflow-y: auto;">
-                    <table class="data-table">
-                        <thead>
-                            <tr>
-                                <th>Ângulo</th>
-                                <th>Distância</th>
-                                <th>Timestamp</th>
-                                <th>Hora</th>
-                            </tr>
-                        </thead>
-                        <tbody id="readingsTable">
-                            <tr>
-                                <td colspan="4" style="text-align: center;">Aguardando dados do radar...</td>
-                            </tr>
-                        </tbody>
-                    </table>
-                </div>
-            </div>
-
-            <div class="card">
-                <h2>🎮 Controles</h2>
-                <div class="controls">
-                    <button onclick="clearData()">🗑️ Limpar Dados</button>
-                    <button onclick="testConnection()">🔍 Testar Conexão</button>
-                    <button onclick="fetchData()">🔄 Atualizar Dados</button>
-                </div>
-            </div>
-        </div>
-
-        <script>
-            let radarChart, distanceChart;
-            let updateInterval;
-
-            // Inicializar gráficos
-            function initializeCharts() {
-                const radarCtx = document.getElementById('radarChart').getContext('2d');
-                radarChart = new Chart(radarCtx, {
-                    type: 'radar',
-                    data: {
-                        labels: Array.from({length: 37}, (_, i) => i * 5 + '°'),
-                        datasets: [{
-                            label: 'Distância (cm)',
-                            data: Array(37).fill(0),
-                            backgroundColor: 'rgba(54, 162, 235, 0.2)',
-                            borderColor: 'rgba(54, 162, 235, 1)',
-                            borderWidth: 2
-                        }]
-                    },
-                    options: {
-                        scales: {
-                            r: {
-                                beginAtZero: true,
-                                max: 200,
-                                ticks: { stepSize: 50 }
-                            }
-                        }
-                    }
-                });
-
-                const distanceCtx = document.getElementById('distanceChart').getContext('2d');
-                distanceChart = new Chart(distanceCtx, {
-                    type: 'line',
-                    data: {
-                        labels: [],
-                        datasets: [{
-                            label: 'Distância (cm)',
-                            data: [],
-                            borderColor: 'rgba(255, 99, 132, 1)',
-                            backgroundColor: 'rgba(255, 99, 132, 0.1)',
-                            borderWidth: 2,
-                            fill: true
-                        }]
-                    },
-                    options: {
-                        scales: {
-                            y: {
-                                beginAtZero: true,
-                                max: 200
-                            }
-                        }
-                    }
-                });
-            }
-
-            // Atualizar status
-            async function updateDBStatus() {
-                try {
-                    const response = await fetch('/api/status');
-                    const data = await response.json();
-                    
-                    const dbStatus = document.getElementById('dbStatus');
-                    if (data.database === 'postgresql') {
-                        dbStatus.className = 'status online';
-                        dbStatus.innerHTML = '<div>🗄️ Banco de Dados</div><div>✅ PostgreSQL</div>';
-                    } else {
-                        dbStatus.className = 'status connecting';
-                        dbStatus.innerHTML = '<div>🗄️ Banco de Dados</div><div>🔄 Memória</div>';
-                    }
-                } catch (error) {
-                    document.getElementById('dbStatus').className = 'status offline';
-                    document.getElementById('dbStatus').innerHTML = '<div>🗄️ Banco de Dados</div><div>❌ Offline</div>';
-                }
-            }
-
-            // Buscar dados
-            async function fetchData() {
-                try {
-                    const response = await fetch('/api/radar/latest');
-                    const data = await response.json();
-                    
-                    if (data && data.length > 0) {
-                        updateRadarStatus('online');
-                        updateCharts(data[0]);
-                        updateTable(data);
-                        updateLastUpdate();
-                    } else {
-                        updateRadarStatus('offline');
-                    }
-                } catch (error) {
-                    updateRadarStatus('offline');
-                }
-            }
-
-            function updateRadarStatus(status) {
-                const radarStatus = document.getElementById('radarStatus');
-                if (status === 'online') {
-                    radarStatus.className = 'status online';
-                    radarStatus.innerHTML = '<div>📡 Radar</div><div>✅ Recebendo dados</div>';
-                } else {
-                    radarStatus.className = 'status offline';
-                    radarStatus.innerHTML = '<div>📡 Radar</div><div>❌ Sem dados</div>';
-                }
-            }
-
-            function updateLEDStatus(distance) {
-                const ledStatus = document.getElementById('ledStatus');
-                if (distance < 30) {
-                    ledStatus.className = 'status offline';
-                    ledStatus.innerHTML = '<div>💡 LED RGB</div><div>🔴 Objeto Detectado</div>';
-                } else {
-                    ledStatus.className = 'status online';
-                    ledStatus.innerHTML = '<div>💡 LED RGB</div><div>🟢 Área Livre</div>';
-                }
-            }
-
-            function updateCharts(latestData) {
-                if (!latestData) return;
-                
-                updateLEDStatus(latestData.distance);
-                
-                // Radar
-                const angleIndex = Math.floor(latestData.angle / 5);
-                if (angleIndex >= 0 && angleIndex < 37) {
-                    radarChart.data.datasets[0].data[angleIndex] = latestData.distance;
-                    radarChart.update('none');
-                }
-                
-                // Linha
-                const time = new Date().toLocaleTimeString();
-                distanceChart.data.labels.push(time);
-                distanceChart.data.datasets[0].data.push(latestData.distance);
-                
-                if (distanceChart.data.labels.length > 20) {
-                    distanceChart.data.labels.shift();
-                    distanceChart.data.datasets[0].data.shift();
-                }
-                distanceChart.update('none');
-            }
-
-            function updateTable(data) {
-                const tableBody = document.getElementById('readingsTable');
-                tableBody.innerHTML = '';
-                
-                data.slice(0, 10).forEach(item => {
-                    const row = document.createElement('tr');
-                    const time = new Date(item.created_at || Date.now()).toLocaleTimeString();
-                    
-                    row.innerHTML = `
-                        <td>${item.angle}°</td>
-                        <td>${item.distance} cm</td>
-                        <td>${item.timestamp}</td>
-                        <td>${time}</td>
-                    `;
-                    tableBody.appendChild(row);
-                });
-            }
-
-            function updateLastUpdate() {
-                document.getElementById('lastUpdate').textContent = 
-                    `Última atualização: ${new Date().toLocaleTimeString()}`;
-            }
-
-            async function clearData() {
-                if (!confirm('Limpar todos os dados?')) return;
-                try {
-                    await fetch('/api/radar/clear', {method: 'DELETE'});
-                    alert('Dados limpos!');
-                    location.reload();
-                } catch (error) {
-                    alert('Erro ao limpar dados.');
-                }
-            }
-
-            async function testConnection() {
-                await updateDBStatus();
-                await fetchData();
-                alert('Teste de conexão concluído!');
-            }
-
-            // Inicializar
-            document.addEventListener('DOMContentLoaded', function() {
-                initializeCharts();
-                updateDBStatus();
-                fetchData();
-                
-                // Atualizar a cada 3 segundos
-                updateInterval = setInterval(fetchData, 3000);
-            });
-        </script>
-    </body>
-    </html>
-    '''
+    asset, _ = dashboard_assets.get('index.html')
+    if asset is None:
+        return jsonify({'error': 'Dashboard indisponível'}), 404
+    # Sem hash no URL: o browser revalida sempre, mas um 304 não tem corpo
+    return asset_response(asset, 'no-cache')
+
+# Ficheiros do dashboard; com o hash do conteúdo no nome nunca mudam
+@app.route('/static/<path:name>')
+def static_file(name):
+    asset, versioned = dashboard_assets.get(name)
+    if asset is None:
+        return jsonify({'error': 'Ficheiro não encontrado'}), 404
+    return asset_response(asset, STATIC_CACHE_CONTROL if versioned else 'no-cache')
+
+def asset_response(asset, cache_control):
+    encoding = negotiate(request.accept_encodings)
+    response = Response(asset.encoded(encoding), mimetype=asset.mimetype)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(f'{asset.digest}-{encoding}' if encoding else asset.digest)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+# Validação de uma leitura (levanta ValueError com a mensagem de erro);
+# sem device_id na leitura vale o do lote (ou 0)
+def parse_reading(item, device_id=0):
+    if not isinstance(item, dict):
+        raise ValueError('Leitura deve ser um objeto JSON')
+    angle = item.get('angle')
+    distance = item.get('distance')
+    timestamp = item.get('timestamp')
+    device_id = item.get('device_id', device_id)
+    if angle is None or distance is None:
+        raise ValueError('Dados incompletos')
+    if timestamp is None:
+        timestamp = 0
+    for name, value in (('angle', angle), ('distance', distance), ('timestamp', timestamp),
+                        ('device_id', device_id)):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f'Campo {name} inválido: {value!r}')
+    if not 0 <= angle <= 360:
+        raise ValueError(f'Ângulo fora do intervalo: {angle}')
+    if not 0 <= distance <= INT_MAX:
+        raise ValueError(f'Distância fora do intervalo: {distance}')
+    if not 0 <= timestamp <= BIGINT_MAX:
+        raise ValueError(f'Timestamp fora do intervalo: {timestamp}')
+    if not 0 <= device_id <= DEVICE_ID_MAX:
+        raise ValueError(f'device_id fora do intervalo: {device_id}')
+    return angle, distance, timestamp, device_id
+
+# ?device=<id> das rotas de leitura: só esse dispositivo (None = todos)
+def request_device():
+    value = request.args.get('device')
+    if value in (None, ''):
+        return None
+    try:
+        device = int(value)
+    except ValueError:
+        raise ValueError(f'device inválido: {value!r}')
+    if not 0 <= device <= DEVICE_ID_MAX:
+        raise ValueError(f'device fora do intervalo: {device}')
+    return device
+
+def group_by_device(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[3], []).append(row)
+    return groups
+
+# Estado por dispositivo criado na primeira utilização
+def _device_state(registry, device_id, factory):
+    state = registry.get(device_id)
+    if state is None:
+        with _device_lock:
+            state = registry.get(device_id)
+            if state is None:
+                state = registry[device_id] = factory()
+    return state
+
+# Cópia de (device_id, estado): outra thread pode acrescentar um dispositivo
+# a meio da iteração
+def device_states(registry):
+    with _device_lock:
+        return list(registry.items())
+
+def sweep_for(device):
+    if device is None:
+        return sweep
+    return _device_state(device_sweeps, device, lambda: SweepSnapshot(SWEEP_RESOLUTION, SWEEP_MAX_ANGLE))
+
+def tracker_for(device_id):
+    return _device_state(device_trackers, device_id, lambda: ObjectTracker(
+        SWEEP_RESOLUTION, SWEEP_MAX_ANGLE, **TRACKING_CONFIG))
+
+def hub_for(device):
+    if device is None:
+        return hub
+    return _device_state(device_hubs, device, lambda: PubSubHub(SSE_BUFFER_SIZE, SSE_HISTORY))
+
+# Gravar várias leituras numa única transação (PostgreSQL) ou na memória
+def save_readings(rows):
+    if not rows:
+        return
+    with_storage(lambda store: store.save(rows), spill=lambda: spill_readings(rows))
+    response_cache.invalidate()
+
+# PostgreSQL em baixo: guardar no journal (para o replay) e também no engine
+# local, para que as leituras recentes continuem visíveis no dashboard
+def spill_readings(rows):
+    journal.append(rows, time.time())
+    try:
+        local_store.save(rows)
+    except DeviceLimitExceeded as e:
+        # O journal já as guarda: só a cópia local fica de fora
+        logger.warning(f"⚠️ Leituras fora do engine local: {e}")
+
+# Aceitar leituras: gravar já ou, em modo write-behind, enfileirar para a
+# thread de fundo. Devolve True se as leituras ficaram na fila.
+def ingest_readings(rows):
+    if not rows:
+        return False
+    by_device = group_by_device(rows)
+    if STORAGE_ENGINE != 'postgresql':
+        # Recusar já (e não na thread do write-behind) um dispositivo que não cabe
+        local_store.admit(by_device)
+    if write_behind is not None:
+        write_behind.put(rows)
+        queued = True
+    else:
+        save_readings(rows)
+        queued = False
+    readings_ingested.inc(len(rows))
+    sweep.update_many(rows)
+    for device_id, device_rows in by_device.items():
+        sweep_for(device_id).update_many(device_rows)
+        if TRACKING and tracker_for(device_id).update_many(device_rows):
+            publish_objects(device_id)
+    publish_readings(rows, by_device)
+    return queued
+
+# Enviar leituras aceites aos clientes do stream SSE: todos recebem no hub
+# geral; os hubs por dispositivo só existem se alguém os subscreveu
+def publish_readings(rows, by_device):
+    created_at = datetime.now().isoformat()
+
+    def events(device_rows):
+        return [{
+            'angle': angle,
+            'distance': distance,
+            'timestamp': timestamp,
+            'device_id': device_id,
+            'created_at': created_at
+        } for angle, distance, timestamp, device_id in device_rows]
+
+    hub.publish_many('reading', events(rows))
+    for device_id, device_rows in by_device.items():
+        device_hub = device_hubs.get(device_id)
+        if device_hub is not None:
+            device_hub.publish_many('reading', events(device_rows))
+
+# Objetos do varrimento que acabou de fechar (evento 'objects' do stream)
+def publish_objects(device_id):
+    event = {'device_id': device_id, **device_trackers[device_id].snapshot()}
+    hub.publish('objects', event)
+    device_hub = device_hubs.get(device_id)
+    if device_hub is not None:
+        device_hub.publish('objects', event)
+
+def queue_full_response(error):
+    if isinstance(error, PoolExhausted):
+        return pool_exhausted_response(error)
+    logger.warning(f"⚠️ Fila de escrita cheia: {error}")
+    response = jsonify({'error': 'Fila de escrita cheia, tente novamente', 'detail': str(error)})
+    if isinstance(error, JournalFull):
+        retry_after = db_breaker.stats()['retry_in']
+    else:
+        retry_after = WRITE_BEHIND_CONFIG['flush_interval']
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 503
+
+def device_limit_response(error):
+    logger.warning(f"⚠️ {error}")
+    return jsonify({'error': str(error)}), 507
+
+# Todas as conexões do pool ocupadas (o PostgreSQL está bem): 503 para o
+# cliente tentar de novo, sem abrir o circuito nem servir o engine local
+@app.errorhandler(PoolExhausted)
+def pool_exhausted_response(error):
+    logger.warning(f"⚠️ Pool de conexões esgotado: {error}")
+    response = jsonify({'error': 'Servidor ocupado, tente novamente', 'detail': str(error)})
+    response.headers['Retry-After'] = str(max(1, math.ceil(DB_POOL_CONFIG['checkout_timeout'])))
+    return response, 503
+
+# Últimas leituras, da mais recente para a mais antiga
+def fetch_latest(limit, device=None):
+    return with_storage(lambda store: store.latest(limit, device))
+
+# ?since=<cursor>&limit=N; None sem ?since (levanta ValueError se inválido).
+# O cursor é "<epoch>-<id>" (next_cursor de uma página anterior), 0 para
+# ler desde o início ou "latest" para começar pelas últimas leituras
+def request_sync():
+    since = request.args.get('since')
+    if since in (None, ''):
+        return None
+    epoch, _, cursor = since.rpartition('-')
+    try:
+        cursor = None if since == SYNC_LATEST else int(cursor)
+        limit = int(request.args.get('limit', SYNC_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('since deve ser "<epoch>-<id>", 0 ou latest e limit um inteiro')
+    if not 1 <= limit <= SYNC_MAX_LIMIT:
+        raise ValueError(f'limit deve estar entre 1 e {SYNC_MAX_LIMIT}')
+    return epoch, cursor, limit
+
+# Uma página de leituras com id > cursor no engine ``store``; next_cursor é
+# o id da última (ou o próprio cursor sem novidades) com o epoch do engine e
+# has_more indica que há mais para pedir já. None quando o cursor é de outro
+# epoch: outro engine (PostgreSQL em baixo) ou um reinício do modo em memória
+def sync_page(store, epoch, cursor, limit, device):
+    if cursor is None:  # ?since=latest
+        # As últimas ``limit`` até ao cursor: o que chegar depois dele vem
+        # na página seguinte, sem falhas nem repetidas
+        tip = store.last_id()
+        rows = [row for row in store.latest(limit, device) if row['id'] <= tip]
+        rows.reverse()
+        return {'readings': rows, 'next_cursor': f'{store.epoch}-{tip}', 'has_more': False}
+    if cursor and epoch != store.epoch:
+        return None
+    rows = store.since(cursor, limit + 1, device)
+    last = rows[min(limit, len(rows)) - 1]['id'] if rows else cursor
+    return {'readings': rows[:limit], 'next_cursor': f'{store.epoch}-{last}', 'has_more': len(rows) > limit}
+
+def sync_response(epoch, cursor, limit, device):
+    try:
+        page = with_storage(lambda store: sync_page(store, epoch, cursor, limit, device))
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        logger.error(f"Erro PostgreSQL: {e}")
+        page = sync_page(local_store, epoch, cursor, limit, device)
+    if page is None:
+        # Os ids não continuam os do cursor: recomeçar pelas últimas leituras
+        return jsonify({'error': 'Cursor de outro engine ou de antes de um reinício', 'reset': True}), 410
+    return jsonify(page)
+
+# Resposta JSON servida a partir do cache (bytes já codificados + ETag, e a
+# variante gzip/brotli comprimida uma vez por entrada); If-None-Match com o
+# ETag atual devolve 304 sem corpo
+def cached_json_response(key, build):
+    # Outros workers também escrevem no engine partilhado
+    response_cache.validate(local_store.version)
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        with json_encode_seconds.time(key[0]):
+            body = app.json.dumps(build()).encode()
+        entry = response_cache.put(key, body, generation)
+    encoding = None
+    if JSON_COMPRESS_MIN_SIZE and len(entry.body) >= JSON_COMPRESS_MIN_SIZE:
+        encoding = negotiate(request.accept_encodings)
+    response = Response(entry.encoded(encoding), mimetype='application/json')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(f'{entry.etag}-{encoding}' if encoding else entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if JSON_COMPRESS_MIN_SIZE and len(entry.body) >= JSON_COMPRESS_MIN_SIZE:
+        response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+# Ler o corpo de um lote: array JSON, objeto único ou NDJSON (uma leitura por
+# linha). Devolve (leituras, device_id do lote); {"device_id": N, "readings": [...]}
+# aplica N às leituras que não trazem o seu
+def read_batch_body():
+    mimetype = request.mimetype or ''
+    if mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f'JSON inválido: {e}'))
+        return items, 0
+    data = request.get_json(silent=True)
+    if data is None:
+        raise ValueError('Corpo deve ser um array JSON ou NDJSON')
+    device_id = 0
+    if isinstance(data, dict):
+        if 'readings' in data:
+            device_id = data.get('device_id', 0)
+        data = data.get('readings', [data])
+    if not isinstance(data, list):
+        raise ValueError('Corpo deve ser um array JSON ou NDJSON')
+    return data, device_id
 
 @app.route('/api/status')
 def api_status():
+    ensure_database()
     return jsonify({
         "status": "healthy",
-        "database": "postgresql" if USE_POSTGRESQL else "memory",
+        "database": "postgresql" if USE_POSTGRESQL and db_breaker.state == 'closed' else local_store.name,
+        "partitioned": pg_store.partitioned,
+        "pool": db_pool.stats() if db_pool else None,
+        "breaker": db_breaker.stats(),
+        "journal": journal.stats(),
+        "local": local_store.stats(),
+        "write_behind": write_behind.stats() if write_behind is not None else None,
+        "stream": hub.stats(),
+        "cache": response_cache.stats(),
+        "retention": retention_worker.stats() if retention_worker else None,
         "timestamp": datetime.now().isoformat()
     })
 
@@ -457,107 +798,378 @@ def handle_radar_data():
     if request.method == 'POST':
         try:
             data = request.get_json()
-            angle = data.get('angle')
-            distance = data.get('distance')
-            timestamp = data.get('timestamp')
-
-            if angle is None or distance is None:
-                return jsonify({'error': 'Dados incompletos'}), 400
-
-            # Salvar no PostgreSQL ou memória
-            if USE_POSTGRESQL:
-                conn = get_db_connection()
-                if conn:
-                    cur = conn.cursor()
-                    cur.execute(
-                        'INSERT INTO radar_data (angle, distance, timestamp) VALUES (%s, %s, %s)',
-                        (angle, distance, timestamp)
-                    )
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-            else:
-                radar_data.append({
-                    'angle': angle,
-                    'distance': distance,
-                    'timestamp': timestamp,
-                    'created_at': datetime.now().isoformat()
-                })
-                if len(radar_data) > 100:
-                    radar_data.pop(0)
+            try:
+                reading = parse_reading(data)
+            except ValueError as e:
+                readings_rejected.inc(1, 'data')
+                return jsonify({'error': str(e)}), 400
+            angle, distance = reading[0], reading[1]
+
+            # Salvar no PostgreSQL ou memória (ou enfileirar em modo write-behind)
+            try:
+                queued = ingest_readings([reading])
+            except (QueueFull, JournalFull, PoolExhausted) as e:
+                return queue_full_response(e)
+            except DeviceLimitExceeded as e:
+                return device_limit_response(e)
 
             logger.info(f"✅ Dados recebidos: {angle}°, {distance}cm")
+            if queued:
+                return jsonify({'message': 'Dados enfileirados'}), 202
             return jsonify({'message': 'Dados salvos'}), 201
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
     else:  # GET
-        if USE_POSTGRESQL:
-            try:
-                conn = get_db_connection()
-                if conn:
-                    cur = conn.cursor()
-                    cur.execute('''
-                        SELECT angle, distance, timestamp, created_at 
-                        FROM radar_data 
-                        ORDER BY created_at DESC 
-                        LIMIT 100
-                    ''')
-                    results = cur.fetchall()
-                    cur.close()
-                    conn.close()
-                    return jsonify([{
-                        'angle': r[0], 'distance': r[1], 'timestamp': r[2],
-                        'created_at': r[3].isoformat() if r[3] else None
-                    } for r in results])
-            except Exception as e:
-                logger.error(f"Erro PostgreSQL: {e}")
+        try:
+            device = request_device()
+            sync = request_sync()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if sync is not None:
+            return sync_response(*sync, device)
+        try:
+            return cached_json_response(('data', 100, device), lambda: fetch_latest(100, device))
+        except PoolExhausted:
+            raise
+        except Exception as e:
+            logger.error(f"Erro PostgreSQL: {e}")
         
-        return jsonify(radar_data)
+        return jsonify(local_store.latest(100, device))
+
+@app.route('/api/radar/batch', methods=['POST'])
+def handle_radar_batch():
+    try:
+        items, device_id = read_batch_body()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    max_rows = BATCH_MAX_ROWS
+    if STORAGE_ENGINE != 'postgresql' and local_store.max_batch is not None:
+        # Num buffer circular, as primeiras de um lote maior seriam logo reescritas
+        max_rows = min(max_rows, local_store.max_batch)
+    if len(items) > max_rows:
+        return jsonify({'error': f'Lote excede {max_rows} leituras'}), 413
+
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            rows.append(parse_reading(item, device_id))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        readings_rejected.inc(len(errors), 'batch')
+
+    try:
+        queued = ingest_readings(rows)
+    except (QueueFull, JournalFull, PoolExhausted) as e:
+        return queue_full_response(e)
+    except DeviceLimitExceeded as e:
+        return device_limit_response(e)
+    except Exception as e:
+        logger.error(f"❌ Erro ao gravar lote: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    logger.info(f"✅ Lote recebido: {len(rows)} leituras, {len(errors)} rejeitadas")
+    if not rows and errors:
+        status, message = 400, 'Nenhuma leitura válida'
+    elif queued:
+        status, message = 202, 'Lote enfileirado'
+    else:
+        status, message = 201, 'Lote salvo'
+    return jsonify({
+        'message': message,
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': errors
+    }), status
+
+@app.route('/api/radar/frame', methods=['POST'])
+def handle_radar_frame():
+    try:
+        frame = decode_frame(request.get_data(cache=False))
+    except FrameError as e:
+        return jsonify({'error': f'Frame inválido: {e}'}), 400
+
+    # Retransmissão do mesmo varrimento: confirmar sem gravar de novo
+    with _frame_lock:
+        duplicate = last_sweep_seq.get(frame.device_id) == frame.sweep_seq
+        last_sweep_seq[frame.device_id] = frame.sweep_seq
+    if duplicate:
+        return jsonify({'message': 'Frame duplicado', 'device_id': frame.device_id,
+                        'sweep_seq': frame.sweep_seq, 'accepted': 0}), 200
+
+    rows, errors = [], []
+    for index, (angle, distance, timestamp) in enumerate(frame_readings(frame)):
+        try:
+            rows.append(parse_reading({'angle': angle, 'distance': distance, 'timestamp': timestamp},
+                                      frame.device_id))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        readings_rejected.inc(len(errors), 'frame')
+
+    try:
+        queued = ingest_readings(rows)
+    except (QueueFull, JournalFull, PoolExhausted, DeviceLimitExceeded) as e:
+        with _frame_lock:
+            last_sweep_seq.pop(frame.device_id, None)
+        if isinstance(e, DeviceLimitExceeded):
+            return device_limit_response(e)
+        return queue_full_response(e)
+    except Exception as e:
+        with _frame_lock:
+            last_sweep_seq.pop(frame.device_id, None)
+        logger.error(f"❌ Erro ao gravar frame: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    logger.info(f"✅ Frame recebido: dispositivo {frame.device_id}, varrimento {frame.sweep_seq}, {len(rows)} leituras")
+    return jsonify({
+        'message': 'Frame enfileirado' if queued else 'Frame salvo',
+        'device_id': frame.device_id,
+        'sweep_seq': frame.sweep_seq,
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': errors
+    }), 202 if queued else 201
 
 @app.route('/api/radar/latest')
 def get_latest_data():
-    if USE_POSTGRESQL:
-        try:
-            conn = get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                cur.execute('''
-                    SELECT angle, distance, timestamp, created_at 
-                    FROM radar_data 
-                    ORDER BY created_at DESC 
-                    LIMIT 10
-                ''')
-                results = cur.fetchall()
-                cur.close()
-                conn.close()
-                return jsonify([{
-                    'angle': r[0], 'distance': r[1], 'timestamp': r[2],
-                    'created_at': r[3].isoformat() if r[3] else None
-                } for r in results])
-        except:
-            pass
+    try:
+        device = request_device()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return cached_json_response(('latest', 10, device), lambda: fetch_latest(10, device))
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        logger.error(f"Erro PostgreSQL: {e}")
     
-    return jsonify(radar_data[-10:] if radar_data else [])
+    return jsonify(local_store.latest(10, device))
 
 @app.route('/api/radar/clear', methods=['DELETE'])
 def clear_data():
-    if USE_POSTGRESQL:
+    if STORAGE_ENGINE == 'postgresql':
         try:
-            conn = get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                cur.execute('DELETE FROM radar_data')
-                conn.commit()
-                cur.close()
-                conn.close()
-        except:
-            pass
-    
-    radar_data.clear()
+            if not ensure_database():
+                raise StorageUnavailable('PostgreSQL ainda sem conexão')
+            call_database(lambda store: store.clear())
+        except StorageUnavailable as e:
+            # Limpar só a cópia local deixaria os dados reaparecer depois
+            return jsonify({'error': 'PostgreSQL indisponível, tente novamente', 'detail': str(e)}), 503
+        except Exception as e:
+            logger.error(f"❌ Erro ao limpar PostgreSQL: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    local_store.clear()
+    journal.clear()
+    sweep.clear()
+    for _, snapshot in device_states(device_sweeps):
+        snapshot.clear()
+    for _, tracker in device_states(device_trackers):
+        tracker.clear()
+    response_cache.invalidate()
+    hub.publish('reset', {})
+    for _, device_hub in device_states(device_hubs):
+        device_hub.publish('reset', {})
     return jsonify({'message': 'Dados limpos'})
 
+# Preencher o varrimento a partir das leituras recentes (uma vez por
+# processo e por dispositivo)
+def seed_sweep_snapshot(device=None):
+    sweeps_seeded.add(device)
+    snapshot = sweep_for(device)
+    for angle, distance, received_at in with_storage(lambda store: store.recent(SWEEP_SEED_ROWS, device)):
+        snapshot.update(angle, distance, received_at)
+
+@app.route('/api/radar/aggregate')
+def get_aggregate():
+    try:
+        end = parse_time(request.args['to']) if request.args.get('to') else datetime.now()
+        start = parse_time(request.args['from']) if request.args.get('from') else end - timedelta(hours=1)
+        bucket = parse_bucket(request.args.get('bucket', '1m'))
+        angle = request.args.get('angle')
+        angle = int(angle) if angle not in (None, '') else None
+        device = request_device()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start >= end:
+        return jsonify({'error': 'from deve ser anterior a to'}), 400
+    bucket_count = math.ceil((end - start).total_seconds() / bucket)
+    if bucket_count > AGGREGATE_MAX_BUCKETS:
+        return jsonify({'error': f'Intervalo gera {bucket_count} buckets (máx {AGGREGATE_MAX_BUCKETS})'}), 400
+
+    try:
+        rows = with_storage(lambda store: store.aggregate(start, end, bucket, angle, device))
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erro na agregação: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'angle': angle,
+        'device': device,
+        'buckets': rows
+    })
+
+# Histórico completo (ou de um intervalo) em CSV ou NDJSON, escrito à medida
+# que as páginas chegam da base: a memória usada não depende do tamanho
+@app.route('/api/radar/export')
+def export_data():
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'format deve ser um de: {", ".join(EXPORT_FORMATS)}')
+        end = parse_time(request.args['to']) if request.args.get('to') else datetime.now()
+        start = parse_time(request.args['from']) if request.args.get('from') else datetime.fromtimestamp(0)
+        device = request_device()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start >= end:
+        return jsonify({'error': 'from deve ser anterior a to'}), 400
+
+    try:
+        pages = with_storage(lambda store: store.export(start, end, device, EXPORT_PAGE_SIZE))
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erro na exportação: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    logger.info(f"📤 Exportação {export_format}: {start.isoformat()} até {end.isoformat()}")
+    body = export_csv(pages) if export_format == 'csv' else export_ndjson(pages)
+    encoding = negotiate(request.accept_encodings)
+    if encoding is not None:
+        body = compress_stream(body, encoding)
+    response = Response(body, mimetype=EXPORT_FORMATS[export_format])
+    # Também quando o cliente desiste a meio: devolve a conexão ao pool
+    response.call_on_close(pages.close)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="radar-{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}.{export_format}"')
+    return response
+
+def export_csv(pages):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def export_ndjson(pages):
+    for page in pages:
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n'
+                      for row in page).encode()
+
+@app.route('/api/radar/sweep')
+def get_sweep():
+    try:
+        device = request_device()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    snapshot = sweep_for(device)
+    if (ensure_database() or local_store.durable) and device not in sweeps_seeded and snapshot.is_empty():
+        try:
+            seed_sweep_snapshot(device)
+        except Exception as e:
+            logger.error(f"❌ Erro ao carregar varrimento: {e}")
+    return Response(snapshot.payload(), mimetype='application/json')
+
+# Objetos detetados no último varrimento completo de cada dispositivo, com
+# posição (cm, x para 0°, y para 90°), extensão e velocidade estimada
+@app.route('/api/radar/objects')
+def get_objects():
+    if not TRACKING:
+        return jsonify({'error': 'Deteção de objetos desativada (TRACKING=0)'}), 404
+    try:
+        device = request_device()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    server_time = round(time.time(), 3)
+    if device is not None:
+        return jsonify({'server_time': server_time, 'device_id': device,
+                        **tracker_for(device).snapshot()})
+    return jsonify({
+        'server_time': server_time,
+        'devices': [{'device_id': device_id, **tracker.snapshot()}
+                    for device_id, tracker in sorted(device_states(device_trackers))]
+    })
+
+@app.route('/api/radar/stream')
+def radar_stream():
+    try:
+        device = request_device()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = hub_for(device).subscribe(last_event_id)
+
+    def generate():
+        deadline = time.monotonic() + SSE_MAX_DURATION if SSE_MAX_DURATION else None
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while deadline is None or time.monotonic() < deadline:
+                timeout = SSE_HEARTBEAT if deadline is None else min(SSE_HEARTBEAT, deadline - time.monotonic())
+                events = subscription.get(timeout=max(timeout, 0))
+                if events:
+                    yield ''.join(events)
+                else:
+                    yield ": ping\n\n"
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Dispositivos vistos pelo armazenamento: última leitura e taxa de ingestão
+# (leituras por segundo na última DEVICE_RATE_WINDOW). Uma consulta pelo
+# índice (device_id, created_at) por dispositivo, sem ler as leituras
+@app.route('/api/devices')
+def get_devices():
+    now = time.time()
+    try:
+        rows = with_storage(lambda store: store.devices(now - DEVICE_RATE_WINDOW))
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erro ao listar dispositivos: {e}")
+        return jsonify({'error': str(e)}), 500
+    with _frame_lock:
+        sweep_seqs = dict(last_sweep_seq)
+    return jsonify({
+        'window': DEVICE_RATE_WINDOW,
+        'devices': [{
+            'device_id': device_id,
+            'last_seen': datetime.fromtimestamp(last_seen).isoformat() if last_seen else None,
+            'age': round(now - last_seen, 3) if last_seen else None,
+            'recent_readings': received,
+            'rate': round(received / DEVICE_RATE_WINDOW, 3),
+            'last_sweep_seq': sweep_seqs.get(device_id),
+        } for device_id, last_seen, received in rows],
+        'timestamp': datetime.fromtimestamp(now).isoformat()
+    })
+
+@app.route('/api/metrics')
+def get_metrics():
+    return Response(metrics_registry.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/health')
 def health():
     return jsonify({"status": "healthy"})
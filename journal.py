@@ -0,0 +1,156 @@
+import io
+import logging
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# angle, distance, timestamp do dispositivo, hora de receção (epoch), device_id
+RECORD = struct.Struct('<hiqdH')
+
+
+class JournalFull(Exception):
+    pass
+
+
+class SpillJournal:
+    """Journal local e limitado das leituras que não chegaram ao PostgreSQL.
+
+    Registos de tamanho fixo acrescentados a um ficheiro; ``peek``/``commit``
+    consomem-nos por ordem durante o replay e a posição lida fica num ficheiro
+    ``.offset`` ao lado, para que um reinício não repita lotes já gravados.
+    Sem ``path`` (ou com o ficheiro já em uso por outro processo) fica em memória.
+    """
+
+    def __init__(self, path, max_rows=100000, fsync=False):
+        self.path = path
+        self.max_rows = max_rows
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._offset = 0
+        self._counters = {
+            'spilled': 0,
+            'replayed': 0,
+            'rejected': 0,
+        }
+
+    # O ficheiro só é aberto na primeira utilização (depois de um eventual fork)
+    def _open_locked(self):
+        if self._file is not None:
+            return
+        if self.path:
+            try:
+                f = open(self.path, 'a+b')
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                logger.warning(f"⚠️ Journal {self.path} indisponível ({e}); usando journal em memória")
+                self.path = None
+            else:
+                self._file = f
+                size = os.fstat(f.fileno()).st_size
+                # Registo incompleto de uma escrita interrompida: descartar
+                self._size = size - size % RECORD.size
+                if self._size != size:
+                    f.truncate(self._size)
+                self._offset = min(self._read_offset(), self._size)
+                if self.pending_locked():
+                    logger.info(f"📼 Journal com {self.pending_locked()} leituras por reenviar")
+                return
+        self._file = io.BytesIO()
+        self._size = self._offset = 0
+
+    def _read_offset(self):
+        try:
+            with open(self.path + '.offset') as f:
+                offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        return offset - offset % RECORD.size
+
+    def _write_offset_locked(self):
+        if not self.path:
+            return
+        tmp = self.path + '.offset.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(self._offset))
+        os.replace(tmp, self.path + '.offset')
+
+    def pending_locked(self):
+        return (self._size - self._offset) // RECORD.size
+
+    @property
+    def pending(self):
+        with self._lock:
+            # Sem ficheiro ainda: nada pendente (e não criá-lo só para ver)
+            if self._file is None and not (self.path and os.path.exists(self.path)):
+                return 0
+            self._open_locked()
+            return self.pending_locked()
+
+    def append(self, rows, received_at):
+        """Acrescenta as leituras; levanta JournalFull se exceder ``max_rows``."""
+        data = b''.join(RECORD.pack(angle, distance, timestamp, received_at, device_id)
+                        for angle, distance, timestamp, device_id in rows)
+        count = len(data) // RECORD.size
+        with self._lock:
+            self._open_locked()
+            if self.pending_locked() + count > self.max_rows:
+                self._counters['rejected'] += count
+                raise JournalFull(f"journal cheio ({self.pending_locked()}/{self.max_rows})")
+            self._file.seek(0, io.SEEK_END)
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync and self.path:
+                os.fsync(self._file.fileno())
+            self._size += len(data)
+            self._counters['spilled'] += count
+
+    def peek(self, limit):
+        """Até ``limit`` registos mais antigos como (angle, distance, timestamp, received_at, device_id)."""
+        with self._lock:
+            self._open_locked()
+            count = min(limit, self.pending_locked())
+            if count == 0:
+                return []
+            self._file.seek(self._offset)
+            data = self._file.read(count * RECORD.size)
+        return list(RECORD.iter_unpack(data))
+
+    def commit(self, count):
+        """Marca os ``count`` registos mais antigos como gravados."""
+        with self._lock:
+            self._offset = min(self._offset + count * RECORD.size, self._size)
+            self._counters['replayed'] += count
+            if self._offset == self._size:
+                self._truncate_locked()
+            else:
+                self._write_offset_locked()
+
+    def clear(self):
+        with self._lock:
+            if self._file is not None:
+                self._truncate_locked()
+
+    def _truncate_locked(self):
+        self._file.seek(0)
+        self._file.truncate(0)
+        self._size = self._offset = 0
+        self._write_offset_locked()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'pending': self.pending_locked(),
+                'max_rows': self.max_rows,
+                **self._counters,
+            }
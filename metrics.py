@@ -0,0 +1,218 @@
+from bisect import bisect_left
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Buckets em segundos: de 0.5 ms a 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [contagens por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """Valor lido só no momento do scrape (sem custo no caminho quente)."""
+
+    def __init__(self, name, help, callback):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge',
+                f'{self.name} {_number(value)}']
+
+
+class GaugeGroup:
+    """Vários gauges lidos de um só ``callback`` (um dict) por scrape.
+
+    Para valores que vêm da mesma consulta (ex: ``stats()`` de um engine):
+    ``gauges`` é uma lista de (nome, ajuda, chave do dict).
+    """
+
+    def __init__(self, gauges, callback):
+        self.gauges = gauges
+        self.callback = callback
+
+    def render(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        lines = []
+        for name, help, key in self.gauges:
+            value = values.get(key) if values else None
+            if value is not None:
+                lines.extend([f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {_number(value)}'])
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, callback):
+        return self.register(Gauge(name, help, callback))
+
+    def gauge_group(self, gauges, callback):
+        return self.register(GaugeGroup(gauges, callback))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _sql_operation(sql):
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql[:32].decode('ascii', 'replace')
+    words = str(sql).lstrip().split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+class TimedCursor:
+    """Cursor psycopg2 que mede a duração de cada execute por tipo de SQL."""
+
+    def __init__(self, cursor, histogram, errors):
+        self._cursor = cursor
+        self._histogram = histogram
+        self._errors = errors
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def _timed(self, method, sql, *args):
+        operation = _sql_operation(sql)
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        except Exception:
+            self._errors.inc(1, operation)
+            raise
+        finally:
+            self._histogram.observe(time.perf_counter() - started, operation)
+
+    def execute(self, sql, *args):
+        return self._timed(self._cursor.execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed(self._cursor.executemany, sql, *args)
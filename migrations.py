@@ -0,0 +1,269 @@
+from datetime import date, datetime, timedelta
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock: só um processo aplica migrações de cada vez
+MIGRATION_LOCK_KEY = 7261001
+
+PARTITION_PREFIX = 'radar_data_p'
+_PARTITION_RE = re.compile(r'^radar_data_p(\d{8})$')
+
+# (versão, nome, comandos SQL). Nunca alterar uma migração já publicada:
+# acrescentar uma nova versão.
+MIGRATIONS = [
+    (1, 'create radar_data', [
+        '''
+        CREATE TABLE IF NOT EXISTS radar_data (
+            id SERIAL PRIMARY KEY,
+            angle INTEGER NOT NULL,
+            distance INTEGER NOT NULL,
+            timestamp BIGINT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, 'index created_at and (angle, created_at)', [
+        'CREATE INDEX IF NOT EXISTS idx_radar_data_created_at ON radar_data (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_radar_data_angle_created_at ON radar_data (angle, created_at)',
+    ]),
+    (4, 'create radar_data_minute rollup', [
+        '''
+        CREATE TABLE IF NOT EXISTS radar_data_minute (
+            bucket TIMESTAMP NOT NULL,
+            angle INTEGER NOT NULL,
+            count BIGINT NOT NULL,
+            min_distance INTEGER NOT NULL,
+            max_distance INTEGER NOT NULL,
+            sum_distance BIGINT NOT NULL,
+            PRIMARY KEY (bucket, angle)
+        )
+        ''',
+    ]),
+    # ADD COLUMN com DEFAULT constante não reescreve a tabela (PostgreSQL 11+);
+    # as linhas antigas ficam no dispositivo 0
+    (5, 'device_id on radar_data and radar_data_minute', [
+        'ALTER TABLE radar_data ADD COLUMN IF NOT EXISTS device_id INTEGER NOT NULL DEFAULT 0',
+        'CREATE INDEX IF NOT EXISTS idx_radar_data_device_created_at ON radar_data (device_id, created_at)',
+        'ALTER TABLE radar_data_minute ADD COLUMN IF NOT EXISTS device_id INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE radar_data_minute DROP CONSTRAINT IF EXISTS radar_data_minute_pkey',
+        'ALTER TABLE radar_data_minute ADD PRIMARY KEY (device_id, bucket, angle)',
+        'CREATE INDEX IF NOT EXISTS idx_radar_data_minute_bucket ON radar_data_minute (bucket)',
+    ]),
+    # Sincronização por cursor com ?device= (WHERE device_id = … AND id > … ORDER BY id)
+    (6, 'index (device_id, id) for cursor sync', [
+        'CREATE INDEX IF NOT EXISTS idx_radar_data_device_id ON radar_data (device_id, id)',
+    ]),
+]
+
+
+def _partition_table_sql(day):
+    name = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+    return name, (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF radar_data "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+# Converter radar_data numa tabela particionada por dia (RANGE em created_at),
+# copiando as linhas existentes para as partições dos dias correspondentes.
+# Com DB_PARTITIONED ativado depois da migração 5, a tabela antiga já tem
+# device_id: a nova tabela tem sempre a coluna e os índices, e a cópia leva-a.
+def _partition_by_day(cur):
+    cur.execute('ALTER TABLE radar_data RENAME TO radar_data_legacy')
+    cur.execute('DROP INDEX IF EXISTS idx_radar_data_created_at')
+    cur.execute('DROP INDEX IF EXISTS idx_radar_data_angle_created_at')
+    cur.execute('DROP INDEX IF EXISTS idx_radar_data_device_created_at')
+    cur.execute('DROP INDEX IF EXISTS idx_radar_data_device_id')
+    cur.execute('''
+        CREATE TABLE radar_data (
+            id BIGINT NOT NULL DEFAULT nextval('radar_data_id_seq'),
+            angle INTEGER NOT NULL,
+            distance INTEGER NOT NULL,
+            timestamp BIGINT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            device_id INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    ''')
+    cur.execute('ALTER SEQUENCE radar_data_id_seq OWNED BY radar_data.id')
+    cur.execute('CREATE TABLE radar_data_default PARTITION OF radar_data DEFAULT')
+    cur.execute('CREATE INDEX idx_radar_data_created_at ON radar_data (created_at)')
+    cur.execute('CREATE INDEX idx_radar_data_angle_created_at ON radar_data (angle, created_at)')
+    cur.execute('CREATE INDEX idx_radar_data_device_created_at ON radar_data (device_id, created_at)')
+    cur.execute('CREATE INDEX idx_radar_data_device_id ON radar_data (device_id, id)')
+    cur.execute('''
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'radar_data_legacy' AND column_name = 'device_id'
+        )
+    ''')
+    device_column = ', device_id' if cur.fetchone()[0] else ''
+
+    cur.execute('''
+        SELECT DISTINCT date_trunc('day', COALESCE(created_at, CURRENT_TIMESTAMP))::date
+        FROM radar_data_legacy
+    ''')
+    for (day,) in cur.fetchall():
+        cur.execute(_partition_table_sql(day)[1])
+    cur.execute(f'''
+        INSERT INTO radar_data (id, angle, distance, timestamp, created_at{device_column})
+        SELECT id, angle, distance, timestamp, COALESCE(created_at, CURRENT_TIMESTAMP){device_column}
+        FROM radar_data_legacy
+    ''')
+    cur.execute('DROP TABLE radar_data_legacy')
+
+
+PARTITION_MIGRATION = (3, 'partition radar_data by day', _partition_by_day)
+
+
+def _applied_versions(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cur.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cur.fetchall()}
+
+
+def pending_migrations(partitioned=False):
+    migrations = list(MIGRATIONS)
+    if partitioned:
+        migrations.append(PARTITION_MIGRATION)
+    return sorted(migrations, key=lambda m: m[0])
+
+
+def migrate(conn, partitioned=False):
+    """Aplica as migrações em falta, cada uma na sua transação.
+
+    Devolve a lista de versões aplicadas nesta chamada.
+    """
+    applied_now = []
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_KEY,))
+        try:
+            applied = _applied_versions(cur)
+            conn.commit()
+            for version, name, steps in pending_migrations(partitioned):
+                if version in applied:
+                    continue
+                logger.info(f"🔧 Aplicando migração {version}: {name}")
+                if callable(steps):
+                    steps(cur)
+                else:
+                    for sql in steps:
+                        cur.execute(sql)
+                cur.execute(
+                    'INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                    (version, name)
+                )
+                conn.commit()
+                applied_now.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    finally:
+        cur.close()
+    if partitioned:
+        ensure_partitions(conn)
+    return applied_now
+
+
+def is_partitioned(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table
+                WHERE partrelid = to_regclass('radar_data')
+            )
+        ''')
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def list_partitions(conn):
+    """Partições diárias existentes como lista de (nome, dia)."""
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('radar_data')
+        ''')
+        partitions = []
+        for (name,) in cur.fetchall():
+            match = _PARTITION_RE.match(name)
+            if match:
+                partitions.append((name, datetime.strptime(match.group(1), '%Y%m%d').date()))
+        return sorted(partitions, key=lambda p: p[1])
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def ensure_partitions(conn, days_ahead=3, today=None):
+    """Cria as partições de hoje e dos próximos ``days_ahead`` dias."""
+    today = today or date.today()
+    cur = conn.cursor()
+    created = []
+    try:
+        for offset in range(days_ahead + 1):
+            name, sql = _partition_table_sql(today + timedelta(days=offset))
+            try:
+                cur.execute(sql)
+                conn.commit()
+                created.append(name)
+            except Exception as e:
+                # Normalmente: linhas desse dia já caíram na partição default
+                conn.rollback()
+                logger.warning(f"⚠️ Não foi possível criar a partição {name}: {e}")
+    finally:
+        cur.close()
+    return created
+
+
+def drop_partitions_before(conn, cutoff):
+    """Remove as partições diárias inteiramente anteriores a ``cutoff``."""
+    dropped = []
+    cur = conn.cursor()
+    try:
+        for name, day in list_partitions(conn):
+            if day + timedelta(days=1) <= cutoff:
+                cur.execute(f'DROP TABLE IF EXISTS {name}')
+                conn.commit()
+                dropped.append(name)
+    finally:
+        cur.close()
+    if dropped:
+        logger.info(f"🗑️ Partições removidas: {', '.join(dropped)}")
+    return dropped
+
+
+def clear_partitioned(conn, days_ahead=3):
+    """Apaga todos os dados removendo as partições (sem DELETE linha a linha).
+
+    Os resumos por minuto vão na mesma transação.
+    """
+    cur = conn.cursor()
+    try:
+        for name, _ in list_partitions(conn):
+            cur.execute(f'DROP TABLE IF EXISTS {name}')
+        cur.execute('TRUNCATE radar_data_default')
+        cur.execute('DELETE FROM radar_data_minute')
+        conn.commit()
+    finally:
+        cur.close()
+    ensure_partitions(conn, days_ahead)
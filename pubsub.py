@@ -0,0 +1,120 @@
+from collections import deque
+import json
+import threading
+import time
+
+
+class Subscription:
+    """Buffer de eventos de um cliente; quando cheio descarta o mais antigo."""
+
+    def __init__(self, hub, maxsize):
+        self._hub = hub
+        self._events = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def _push(self, frame):
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Devolve os eventos pendentes (lista vazia se o timeout expirar)."""
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._hub._unsubscribe(self)
+
+
+class PubSubHub:
+    """Hub publish/subscribe em processo para Server-Sent Events.
+
+    Cada evento é serializado uma única vez no formato SSE e partilhado por
+    todos os assinantes. Os últimos ``history`` eventos ficam guardados para
+    retomar uma ligação a partir do ``Last-Event-ID``.
+    """
+
+    def __init__(self, buffer_size=256, history=1024):
+        self.buffer_size = buffer_size
+        # Prefixo dos ids: distingue ids de uma execução anterior do processo
+        self._epoch = format(int(time.time() * 1000), 'x')
+        self._next_id = 1
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._published = 0
+
+    def _format(self, event_id, event, data):
+        payload = json.dumps(data, separators=(',', ':'))
+        return f"id: {self._epoch}-{event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+    def publish(self, event, data):
+        return self.publish_many(event, [data])
+
+    def publish_many(self, event, items):
+        with self._lock:
+            frames = []
+            for data in items:
+                event_id = self._next_id
+                self._next_id += 1
+                frame = self._format(event_id, event, data)
+                self._history.append((event_id, frame))
+                frames.append(frame)
+            self._published += len(frames)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for frame in frames:
+                sub._push(frame)
+        return self._next_id - 1
+
+    def subscribe(self, last_event_id=None):
+        sub = Subscription(self, self.buffer_size)
+        with self._lock:
+            replay = self._replay_locked(last_event_id)
+            self._subscribers.add(sub)
+        for frame in replay:
+            sub._push(frame)
+        return sub
+
+    def _replay_locked(self, last_event_id):
+        if not last_event_id:
+            return []
+        epoch, _, raw_id = last_event_id.partition('-')
+        try:
+            last = int(raw_id)
+        except ValueError:
+            last = None
+        # O reset leva o id do último evento: ao recarregar o estado o cliente
+        # já o inclui, e a próxima reconexão só recebe o que vier depois
+        if epoch != self._epoch or last is None:
+            # Id de outra execução: o cliente deve recarregar o estado
+            return [self._format(self._next_id - 1, 'reset', {})]
+        if self._history and last < self._history[0][0] - 1:
+            # Eventos perdidos já saíram do histórico
+            return [self._format(self._next_id - 1, 'reset', {})]
+        return [frame for event_id, frame in self._history if event_id > last]
+
+    def _unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            return {
+                'subscribers': len(subscribers),
+                'published': self._published,
+                'last_event_id': self._next_id - 1,
+                'dropped': sum(s.dropped for s in subscribers),
+            }
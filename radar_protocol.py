@@ -0,0 +1,96 @@
+"""Protocolo binário de varrimento entre o firmware (ESP8266) e o servidor.
+
+Um frame leva um varrimento completo (0-180°) num único POST:
+
+    offset  tamanho  campo
+    0       2        magic b'RD'
+    2       1        versão (1)
+    3       1        flags (reservado, 0)
+    4       2        device_id          (u16)
+    6       4        sweep_seq          (u32, incrementa a cada varrimento)
+    10      4        base_ms            (u32, millis() do primeiro registo)
+    14      1        count              (u8, número de registos)
+    15      5*count  registos: angle (u8), distance (u16, cm), dt (u16, ms desde base_ms)
+    ...     2        CRC-16/CCITT-FALSE de todos os bytes anteriores
+
+Todos os inteiros são little-endian (ordem nativa do AVR).
+"""
+from collections import namedtuple
+import struct
+
+MAGIC = b'RD'
+VERSION = 1
+CONTENT_TYPE = 'application/octet-stream'
+
+_HEADER = struct.Struct('<2sBBHIIB')
+_RECORD = struct.Struct('<BHH')
+_CRC = struct.Struct('<H')
+
+HEADER_SIZE = _HEADER.size
+RECORD_SIZE = _RECORD.size
+MAX_RECORDS = 255
+
+Frame = namedtuple('Frame', 'device_id sweep_seq base_ms flags records')
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0xFFFF):
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def encode_frame(device_id, sweep_seq, base_ms, records, flags=0):
+    """records: sequência de (angle, distance, dt_ms)."""
+    records = list(records)
+    if len(records) > MAX_RECORDS:
+        raise FrameError(f'Máximo de {MAX_RECORDS} registos por frame')
+    try:
+        body = bytearray(_HEADER.pack(MAGIC, VERSION, flags, device_id,
+                                      sweep_seq, base_ms, len(records)))
+        for angle, distance, dt in records:
+            body += _RECORD.pack(angle, distance, dt)
+    except struct.error as e:
+        raise FrameError(f'Valor fora do intervalo: {e}')
+    body += _CRC.pack(crc16(body))
+    return bytes(body)
+
+
+def decode_frame(data):
+    data = bytes(data)
+    if len(data) < HEADER_SIZE + _CRC.size:
+        raise FrameError(f'Frame curto demais ({len(data)} bytes)')
+    magic, version, flags, device_id, sweep_seq, base_ms, count = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameError('Magic inválido')
+    if version != VERSION:
+        raise FrameError(f'Versão não suportada: {version}')
+    expected = HEADER_SIZE + count * RECORD_SIZE + _CRC.size
+    if len(data) != expected:
+        raise FrameError(f'Tamanho {len(data)} != {expected} para {count} registos')
+    (crc,) = _CRC.unpack_from(data, expected - _CRC.size)
+    if crc != crc16(data[:expected - _CRC.size]):
+        raise FrameError('CRC inválido')
+    records = [_RECORD.unpack_from(data, HEADER_SIZE + i * RECORD_SIZE) for i in range(count)]
+    return Frame(device_id, sweep_seq, base_ms, flags, records)
+
+
+def frame_readings(frame):
+    """Registos do frame como (angle, distance, timestamp) para o armazenamento."""
+    return [(angle, distance, frame.base_ms + dt) for angle, distance, dt in frame.records]
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+
+from static_assets import compress
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'created_at', '_encoded')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.created_at = time.monotonic()
+        self._encoded = {}
+
+    def encoded(self, encoding):
+        """Corpo comprimido com ``encoding`` (None = original), calculado uma vez."""
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            # Dois pedidos ao mesmo tempo podem comprimir ambos: o resultado é igual
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+
+class ResponseCache:
+    """Respostas JSON já codificadas (bytes + ETag forte) por chave.
+
+    A ingestão chama ``invalidate()``; ``ttl`` (segundos, 0 = sem limite)
+    limita quanto tempo uma entrada vive quando outros processos também
+    escrevem na base de dados.
+    """
+
+    def __init__(self, ttl=0.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._generation = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry.created_at >= self.ttl:
+                del self._entries[key]
+                entry = None
+            self._counters['hits' if entry is not None else 'misses'] += 1
+            return entry
+
+    def put(self, key, body, generation):
+        """Guarda ``body`` se nada foi invalidado desde ``generation``."""
+        entry = CachedResponse(body)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._counters['invalidations'] += 1
+
+    def validate(self, version):
+        """Invalida se ``version`` mudou (escritas de outros processos); None ignora."""
+        if version is not None and version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), **self._counters}
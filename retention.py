@@ -0,0 +1,192 @@
+"""Retenção de radar_data: agrega as leituras antigas por minuto e ângulo em
+radar_data_minute e apaga-as em blocos pequenos (sem locks longos).
+
+Uso como CLI (mesmas variáveis DB_* do servidor):
+
+    python retention.py --keep-hours 24
+    python retention.py --keep-hours 24 --loop 3600
+"""
+from datetime import datetime, timedelta
+import argparse
+import logging
+import threading
+import time
+
+from config import DB_CONFIG
+import migrations
+
+logger = logging.getLogger(__name__)
+
+# Apaga um bloco de linhas antigas e soma-o ao resumo por minuto, dispositivo
+# e ângulo, numa única instrução: o que sai de radar_data entra sempre em
+# radar_data_minute
+ROLLUP_CHUNK_SQL = '''
+    WITH doomed AS (
+        DELETE FROM radar_data
+        WHERE (id, created_at) IN (
+            SELECT id, created_at
+            FROM radar_data
+            WHERE created_at < %(cutoff)s
+            ORDER BY created_at
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING device_id, angle, distance, created_at
+    ), rolled AS (
+        INSERT INTO radar_data_minute AS m
+            (device_id, bucket, angle, count, min_distance, max_distance, sum_distance)
+        SELECT device_id, date_trunc('minute', created_at), angle,
+               count(*), min(distance), max(distance), sum(distance)
+        FROM doomed
+        GROUP BY 1, 2, 3
+        ON CONFLICT (device_id, bucket, angle) DO UPDATE SET
+            count = m.count + EXCLUDED.count,
+            min_distance = LEAST(m.min_distance, EXCLUDED.min_distance),
+            max_distance = GREATEST(m.max_distance, EXCLUDED.max_distance),
+            sum_distance = m.sum_distance + EXCLUDED.sum_distance
+    )
+    SELECT count(*) FROM doomed
+'''
+
+
+def run_retention(conn, keep, chunk_size=5000, summary_keep=None,
+                  max_chunks=None, pause=0.0, lock_timeout_ms=2000, now=None):
+    """Aplica a retenção e devolve um dict com o que foi feito.
+
+    ``keep``/``summary_keep`` são timedelta; cada bloco é uma transação
+    curta com ``lock_timeout`` para nunca ficar preso atrás de outra.
+    """
+    now = now or datetime.now()
+    cutoff = now - keep
+    result = {'cutoff': cutoff.isoformat(), 'rolled_up': 0, 'chunks': 0,
+              'partitions_dropped': [], 'summary_deleted': 0}
+    started = time.monotonic()
+    complete = False
+
+    cur = conn.cursor()
+    try:
+        while max_chunks is None or result['chunks'] < max_chunks:
+            cur.execute('SET LOCAL lock_timeout = %s', (f'{int(lock_timeout_ms)}ms',))
+            cur.execute(ROLLUP_CHUNK_SQL, {'cutoff': cutoff, 'limit': chunk_size})
+            moved = cur.fetchone()[0]
+            conn.commit()
+            result['chunks'] += 1
+            result['rolled_up'] += moved
+            if moved < chunk_size:
+                complete = True
+                break
+            if pause:
+                time.sleep(pause)
+
+        if summary_keep is not None:
+            summary_cutoff = now - summary_keep
+            while True:
+                cur.execute('SET LOCAL lock_timeout = %s', (f'{int(lock_timeout_ms)}ms',))
+                cur.execute('''
+                    DELETE FROM radar_data_minute
+                    WHERE (device_id, bucket, angle) IN (
+                        SELECT device_id, bucket, angle FROM radar_data_minute
+                        WHERE bucket < %s
+                        LIMIT %s
+                    )
+                ''', (summary_cutoff, chunk_size))
+                deleted = cur.rowcount
+                conn.commit()
+                result['summary_deleted'] += deleted
+                if deleted < chunk_size:
+                    break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    # Tabela particionada: as partições antigas já estão vazias, removê-las
+    if complete and migrations.is_partitioned(conn):
+        result['partitions_dropped'] = migrations.drop_partitions_before(conn, cutoff.date())
+
+    result['seconds'] = round(time.monotonic() - started, 3)
+    if result['rolled_up'] or result['summary_deleted']:
+        logger.info(f"🧹 Retenção: {result['rolled_up']} leituras agregadas, "
+                    f"{result['summary_deleted']} resumos removidos em {result['seconds']}s")
+    return result
+
+
+class RetentionWorker:
+    """Executa ``job`` a cada ``interval`` segundos numa thread de fundo."""
+
+    def __init__(self, job, interval):
+        self.job = job
+        self.interval = interval
+        self.last_result = None
+        self.last_error = None
+        self.runs = 0
+        self._stop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_result = self.job()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"❌ Erro na retenção: {e}")
+            self.runs += 1
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Retenção e agregação de radar_data')
+    parser.add_argument('--keep-hours', type=float, required=True,
+                        help='horas de leituras brutas a manter')
+    parser.add_argument('--summary-days', type=float, default=None,
+                        help='dias de resumos por minuto a manter (padrão: todos)')
+    parser.add_argument('--chunk', type=int, default=5000, help='linhas por transação')
+    parser.add_argument('--pause', type=float, default=0.0, help='segundos entre blocos')
+    parser.add_argument('--loop', type=float, default=0,
+                        help='repetir a cada N segundos (0 = executar uma vez)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    import psycopg2
+
+    summary_keep = timedelta(days=args.summary_days) if args.summary_days is not None else None
+    while True:
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            migrations.migrate(conn, partitioned=migrations.is_partitioned(conn))
+            result = run_retention(conn, timedelta(hours=args.keep_hours), args.chunk,
+                                   summary_keep, pause=args.pause)
+            logger.info(f"🧹 Retenção concluída: {result}")
+        finally:
+            conn.close()
+        if not args.loop:
+            return
+        time.sleep(args.loop)
+
+
+if __name__ == '__main__':
+    main()
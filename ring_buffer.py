@@ -0,0 +1,186 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import threading
+import time
+
+# Valor guardado quando a leitura não tem timestamp do dispositivo
+NO_TIMESTAMP = -1
+
+# Slots alocados à partida; as colunas dobram até ``capacity`` conforme enchem
+INITIAL_SLOTS = 1024
+
+
+class RadarRingBuffer:
+    """Buffer circular de capacidade fixa com as leituras em arrays tipados.
+
+    Cada coluna (seq, ângulo, distância, timestamp do dispositivo e hora de
+    receção) é um ``array``; a memória nunca passa de ``capacity`` leituras e
+    o append é O(1) amortizado. As colunas começam com ``INITIAL_SLOTS`` e
+    dobram até ``capacity`` (um dispositivo com poucas leituras ocupa pouco).
+    Cada buffer guarda as leituras de um único dispositivo (``device_id``).
+    """
+
+    def __init__(self, capacity=100000, device_id=0):
+        if capacity < 1:
+            raise ValueError("capacity deve ser >= 1")
+        self.capacity = capacity
+        self.device_id = device_id
+        slots = min(capacity, INITIAL_SLOTS)
+        self._seq = array('q', [0]) * slots
+        self._angle = array('h', [0]) * slots
+        self._distance = array('i', [0]) * slots
+        self._timestamp = array('q', [0]) * slots
+        self._received_at = array('d', [0.0]) * slots
+        self._head = 0  # próximo slot a escrever
+        self._count = 0
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_received_at(self):
+        with self._lock:
+            if not self._count:
+                return None
+            return self._received_at[(self._head - 1) % self.capacity]
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (
+            self._seq, self._angle, self._distance, self._timestamp, self._received_at))
+
+    def extend(self, rows, received_at=None, seqs=None):
+        """Acrescenta [(angle, distance, timestamp, ...), ...]; colunas a mais são ignoradas.
+
+        ``seqs`` dá o seq de cada leitura (crescente, ex: um contador partilhado
+        por vários buffers); sem ele os seqs são consecutivos neste buffer.
+        """
+        received_at = time.time() if received_at is None else received_at
+        with self._lock:
+            seq = None
+            if seqs is None:
+                for row in rows:
+                    seq = self._append_locked(row[0], row[1], row[2], received_at)
+            else:
+                for row, seq in zip(rows, seqs):
+                    self._append_locked(row[0], row[1], row[2], received_at, seq)
+            return seq
+
+    # Antes de dar a volta o buffer só é escrito em sequência: ao chegar ao
+    # fim das colunas alocadas, copiá-las para colunas com o dobro (arrays
+    # novos, as memoryviews já devolvidas continuam válidas)
+    def _grow_locked(self):
+        slots = min(self.capacity, 2 * len(self._seq))
+        for name in ('_seq', '_angle', '_distance', '_timestamp', '_received_at'):
+            old = getattr(self, name)
+            column = array(old.typecode, old)
+            column.extend(array(old.typecode, [0]) * (slots - len(old)))
+            setattr(self, name, column)
+
+    def _append_locked(self, angle, distance, timestamp, received_at, seq=None):
+        slot = self._head
+        if slot == len(self._seq):
+            self._grow_locked()
+        seq = self._next_seq if seq is None else seq
+        self._seq[slot] = seq
+        self._angle[slot] = angle
+        self._distance[slot] = distance
+        self._timestamp[slot] = NO_TIMESTAMP if timestamp is None else timestamp
+        self._received_at[slot] = received_at
+        self._next_seq = seq + 1
+        self._head = (slot + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        return seq
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    # Até dois intervalos [início, fim) de slots com as últimas n leituras,
+    # da mais antiga para a mais recente
+    def _segments_locked(self, n):
+        n = max(0, min(n, self._count))
+        if n == 0:
+            return []
+        start = (self._head - n) % self.capacity
+        if start < self._head:
+            return [(start, self._head)]
+        return [(start, self.capacity), (0, self._head)]
+
+    def views(self, n):
+        """Colunas das últimas n leituras como memoryviews (sem cópia).
+
+        Cada coluna é uma lista de 1 ou 2 segmentos em ordem cronológica.
+        As views apontam para o buffer vivo: escritas posteriores podem
+        sobrescrever os slots mais antigos.
+        """
+        with self._lock:
+            segments = self._segments_locked(n)
+        columns = {
+            'seq': self._seq,
+            'angle': self._angle,
+            'distance': self._distance,
+            'timestamp': self._timestamp,
+            'received_at': self._received_at,
+        }
+        return {
+            name: [memoryview(col)[a:b] for a, b in segments]
+            for name, col in columns.items()
+        }
+
+    def latest(self, n):
+        """Últimas n leituras como dicts, da mais recente para a mais antiga."""
+        with self._lock:
+            slots = [slot for a, b in self._segments_locked(n) for slot in range(a, b)]
+            rows = [self._row(slot) for slot in reversed(slots)]
+        return rows
+
+    def since(self, seq, limit, until=None):
+        """Até ``limit`` leituras com seq > ``seq`` (e <= ``until``), da mais antiga para a mais recente."""
+        with self._lock:
+            rows = []
+            for a, b in self._segments_locked(self._count):
+                # seq cresce ao longo dos slots: bisect em vez de varrer
+                start = a + bisect_right(memoryview(self._seq)[a:b], seq)
+                for slot in range(start, b):
+                    if len(rows) >= limit or (until is not None and self._seq[slot] > until):
+                        return rows
+                    rows.append(self._row(slot))
+            return rows
+
+    def between(self, start, end, after_seq, limit):
+        """Até ``limit`` leituras com ``start`` <= receção < ``end`` e seq > ``after_seq``.
+
+        Tuplos (seq, angle, distance, timestamp, device_id, received_at) da
+        mais antiga para a mais recente; para ler um intervalo por páginas
+        sem o copiar todo, passar em ``after_seq`` o seq da última lida.
+        """
+        with self._lock:
+            rows = []
+            for a, b in self._segments_locked(self._count):
+                first = a + max(bisect_left(memoryview(self._received_at)[a:b], start),
+                                bisect_right(memoryview(self._seq)[a:b], after_seq))
+                for slot in range(first, b):
+                    if len(rows) >= limit or self._received_at[slot] >= end:
+                        return rows
+                    timestamp = self._timestamp[slot]
+                    rows.append((self._seq[slot], self._angle[slot], self._distance[slot],
+                                 None if timestamp == NO_TIMESTAMP else timestamp,
+                                 self.device_id, self._received_at[slot]))
+            return rows
+
+    def _row(self, slot):
+        timestamp = self._timestamp[slot]
+        return {
+            'id': self._seq[slot],
+            'angle': self._angle[slot],
+            'distance': self._distance[slot],
+            'timestamp': None if timestamp == NO_TIMESTAMP else timestamp,
+            'device_id': self.device_id,
+            'created_at': datetime.fromtimestamp(self._received_at[slot]).isoformat()
+        }
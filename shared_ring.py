@@ -0,0 +1,280 @@
+from contextlib import contextmanager
+import logging
+import mmap
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from ring_buffer import NO_TIMESTAMP
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x31474E4952524452  # b'RDRRING1' em little-endian
+VERSION = 1
+
+# Cabeçalho: 8 campos u64. ``committed`` é o seq da última leitura gravada
+# por completo; ``floor`` o último seq apagado por clear(); ``epoch`` a hora
+# (ms) em que o ficheiro foi criado, e com ele a sequência de seqs
+HEADER_FIELDS = ('magic', 'version', 'record_size', 'capacity', 'committed', 'floor', 'epoch', 'reserved')
+HEADER_SIZE = 8 * len(HEADER_FIELDS)
+MAGIC_FIELD, VERSION_FIELD, RECORD_SIZE_FIELD, CAPACITY_FIELD, COMMITTED, FLOOR, EPOCH = range(7)
+
+# Registo de 32 bytes, alinhado: seq é escrito por último (e posto a 0 antes
+# de reescrever o slot), por isso funciona como o contador do seqlock do slot
+RECORD_FIELDS = [
+    ('seq', '<u8'),
+    ('received_at', '<f8'),
+    ('timestamp', '<i8'),
+    ('distance', '<i4'),
+    ('angle', '<i2'),
+    ('device_id', '<u2'),
+]
+
+# Leituras por bloco ao procurar um dispositivo ou um intervalo de tempo
+SCAN_CHUNK = 4096
+
+
+class SharedRingBuffer:
+    """Buffer circular num ficheiro mapeado em memória, partilhado por processos.
+
+    Registos de tamanho fixo (``RECORD_FIELDS``) num ficheiro em ``/dev/shm``
+    (ou outro caminho): todos os workers de um servidor veem as mesmas
+    leituras. As escritas são serializadas (lock do processo + ``flock`` no
+    ficheiro) e publicam ``committed`` no fim do lote; as leituras não
+    bloqueiam: copiam os slots e descartam os que um escritor reescreveu
+    entretanto (seq diferente do esperado antes ou depois da cópia).
+
+    O ficheiro é aberto na primeira utilização de cada processo (depois de
+    um eventual fork, que não pode partilhar o descritor do ``flock``).
+    """
+
+    def __init__(self, path, capacity=1000000):
+        if capacity < 1:
+            raise ValueError("capacity deve ser >= 1")
+        self.path = path
+        self.capacity = capacity
+        self._pid = None
+        self._fd = None
+        self._mmap = None
+        self._header = None
+        self._records = None
+        self._open_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.dropped = 0  # leituras de lotes maiores que o buffer (neste processo)
+
+    # Abrir (ou criar) o ficheiro e mapear o cabeçalho e os registos com NumPy
+    def _ensure_open(self):
+        if self._pid == os.getpid():
+            return
+        with self._open_lock:
+            if self._pid == os.getpid():
+                return
+            self._open()
+
+    def _open(self):
+        import numpy as np
+
+        record = np.dtype(RECORD_FIELDS)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                header = self._read_header(fd)
+                valid = (header is not None and header[MAGIC_FIELD] == MAGIC
+                         and header[VERSION_FIELD] == VERSION and header[RECORD_SIZE_FIELD] == record.itemsize)
+                if valid and header[CAPACITY_FIELD] != self.capacity:
+                    # Outros processos já usam o ficheiro com o tamanho dele
+                    logger.warning(f"⚠️ {self.path} tem capacidade {header[CAPACITY_FIELD]}; "
+                                   f"ignorando {self.capacity}")
+                    self.capacity = int(header[CAPACITY_FIELD])
+                size = HEADER_SIZE + self.capacity * record.itemsize
+                if not valid:
+                    logger.info(f"🧠 Criando buffer partilhado {self.path} ({self.capacity} leituras)")
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                mapped = mmap.mmap(fd, size)
+                if not valid:
+                    fields = np.frombuffer(mapped, dtype='<u8', count=len(HEADER_FIELDS))
+                    fields[:] = 0
+                    fields[VERSION_FIELD] = VERSION
+                    fields[RECORD_SIZE_FIELD] = record.itemsize
+                    fields[CAPACITY_FIELD] = self.capacity
+                    fields[EPOCH] = int(time.time() * 1000)
+                    fields[MAGIC_FIELD] = MAGIC  # por último: cabeçalho completo
+                    del fields
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._mmap = mapped
+        self._header = np.frombuffer(mapped, dtype='<u8', count=len(HEADER_FIELDS))
+        self._records = np.frombuffer(mapped, dtype=record, count=self.capacity, offset=HEADER_SIZE)
+        self._write_lock = threading.Lock()  # o de antes do fork pode ter ficado preso
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _read_header(fd):
+        import numpy as np
+
+        data = os.pread(fd, HEADER_SIZE, 0)
+        if len(data) < HEADER_SIZE:
+            return None
+        return np.frombuffer(data, dtype='<u8')
+
+    @property
+    def committed(self):
+        self._ensure_open()
+        return int(self._header[COMMITTED])
+
+    @property
+    def version(self):
+        """(floor, committed): muda a cada escrita ou clear() de qualquer processo."""
+        self._ensure_open()
+        return int(self._header[FLOOR]), int(self._header[COMMITTED])
+
+    @property
+    def epoch(self):
+        self._ensure_open()
+        return int(self._header[EPOCH])
+
+    @property
+    def dtype(self):
+        import numpy as np
+
+        return np.dtype(RECORD_FIELDS)
+
+    @property
+    def nbytes(self):
+        self._ensure_open()
+        return len(self._mmap)
+
+    # Primeiro seq ainda no buffer (depois de ``committed`` já escrito)
+    def _oldest(self, committed):
+        return max(int(self._header[FLOOR]), committed - self.capacity) + 1
+
+    def __len__(self):
+        committed = self.committed
+        return committed - self._oldest(committed) + 1
+
+    @contextmanager
+    def _locked(self):
+        with self._write_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def extend(self, rows, received_at):
+        """Acrescenta [(angle, distance, timestamp, device_id), ...]; devolve o último seq.
+
+        ``received_at`` é um epoch para o lote inteiro ou um por leitura. De um
+        lote maior que ``capacity`` ficam só as últimas (contadas em ``dropped``).
+        """
+        import numpy as np
+
+        self._ensure_open()
+        dropped = max(0, len(rows) - self.capacity)
+        if dropped:
+            # As primeiras seriam reescritas pelas últimas do próprio lote
+            logger.warning(f"⚠️ Lote de {len(rows)} leituras maior que {self.path} "
+                           f"({self.capacity}): {dropped} descartadas")
+            if not isinstance(received_at, (int, float)):
+                received_at = received_at[dropped:]
+            rows = rows[dropped:]
+        if not rows:
+            return self.committed
+        batch = np.zeros(len(rows), dtype=self._records.dtype)
+        angle, distance, timestamp, device_id = zip(*rows)
+        batch['angle'] = angle
+        batch['distance'] = distance
+        batch['timestamp'] = [NO_TIMESTAMP if t is None else t for t in timestamp]
+        batch['device_id'] = device_id
+        batch['received_at'] = received_at
+        with self._locked():
+            first = int(self._header[COMMITTED]) + 1
+            seqs = np.arange(first, first + len(rows), dtype=np.uint64)
+            for (a, b), (x, y) in self._slots(first, first + len(rows) - 1):
+                target = self._records[a:b]
+                # seq a 0 antes dos dados e o seq novo depois: um leitor a meio
+                # vê seq diferente do esperado e descarta o slot
+                target['seq'] = 0
+                for name, _ in RECORD_FIELDS[1:]:
+                    target[name] = batch[name][x:y]
+                target['seq'] = seqs[x:y]
+            self._header[COMMITTED] = first + len(rows) - 1
+            self.dropped += dropped
+        return first + len(rows) - 1
+
+    # Slots [a, b) e posições no lote [x, y) dos seqs first..last (até 2 segmentos)
+    def _slots(self, first, last):
+        segments = []
+        seq, offset = first, 0
+        while seq <= last:
+            slot = (seq - 1) % self.capacity
+            count = min(last - seq + 1, self.capacity - slot)
+            segments.append(((slot, slot + count), (offset, offset + count)))
+            seq += count
+            offset += count
+        return segments
+
+    def read(self, first, last):
+        """Cópia consistente dos registos com seq em [first, last], por ordem de seq.
+
+        Slots reescritos durante a leitura (o buffer deu a volta) são omitidos.
+        """
+        import numpy as np
+
+        self._ensure_open()
+        if last < first:
+            return np.empty(0, dtype=self._records.dtype)
+        parts = []
+        for (a, b), _ in self._slots(first, last):
+            parts.append(self._records[a:b].copy())
+        copy = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        expected = np.arange(first, last + 1, dtype=np.uint64)
+        after = np.concatenate([self._records['seq'][a:b] for (a, b), _ in self._slots(first, last)])
+        return copy[(copy['seq'] == expected) & (after == expected)]
+
+    def live_range(self):
+        committed = self.committed
+        return self._oldest(committed), committed
+
+    def scan(self, first, last, reverse=False, chunk=SCAN_CHUNK):
+        """Blocos consistentes de [first, last], do início (ou do fim com ``reverse``)."""
+        if reverse:
+            while last >= first:
+                start = max(first, last - chunk + 1)
+                yield self.read(start, last)
+                last = start - 1
+        else:
+            while first <= last:
+                end = min(last, first + chunk - 1)
+                yield self.read(first, end)
+                first = end + 1
+
+    def clear(self):
+        self._ensure_open()
+        with self._locked():
+            self._header[FLOOR] = self._header[COMMITTED]
+
+    def close(self):
+        if self._mmap is not None and self._pid == os.getpid():
+            self._header = self._records = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # ainda há views NumPy vivas: o GC fecha-o
+            os.close(self._fd)
+        self._mmap = self._fd = self._pid = None
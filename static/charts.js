@@ -0,0 +1,139 @@
+// Gráficos do dashboard desenhados diretamente no <canvas>, sem bibliotecas
+// externas (a página funciona sem internet). Mesma forma que o Chart.js usava:
+// alterar data.labels / data.datasets[0].data e chamar update().
+
+const GRID_COLOR = 'rgba(0, 0, 0, 0.1)';
+const TEXT_COLOR = '#666';
+const FONT = '12px sans-serif';
+
+class Plot {
+    constructor(canvas, options) {
+        this.canvas = canvas;
+        this.ctx = canvas.getContext('2d');
+        this.options = options;
+        this.data = {
+            labels: options.labels || [],
+            datasets: [{ label: options.label, data: options.data || [] }]
+        };
+        this.update();
+    }
+
+    // Valor limitado a [0, max] (leituras fora da escala ficam na borda)
+    scaled(value) {
+        return Math.max(0, Math.min(Number(value) || 0, this.options.max)) / this.options.max;
+    }
+
+    drawLegend() {
+        const ctx = this.ctx;
+        ctx.fillStyle = this.options.stroke;
+        ctx.fillRect(this.canvas.width / 2 - 50, 8, 12, 12);
+        ctx.fillStyle = TEXT_COLOR;
+        ctx.textAlign = 'left';
+        ctx.textBaseline = 'middle';
+        ctx.fillText(this.options.label, this.canvas.width / 2 - 32, 14);
+    }
+
+    update() {
+        const ctx = this.ctx;
+        ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
+        ctx.font = FONT;
+        ctx.lineWidth = 1;
+        this.draw(ctx, this.data.datasets[0].data);
+        this.drawLegend();
+    }
+}
+
+// Distância por ângulo: um raio por rótulo, a começar no topo
+class RadarPlot extends Plot {
+    draw(ctx, values) {
+        const { max, step, fill, stroke } = this.options;
+        const n = this.data.labels.length;
+        const cx = this.canvas.width / 2;
+        const cy = this.canvas.height / 2 + 10;
+        const radius = Math.min(cx, cy) - 40;
+        const point = (i, r) => {
+            const angle = -Math.PI / 2 + (2 * Math.PI * i) / n;
+            return [cx + Math.cos(angle) * r, cy + Math.sin(angle) * r];
+        };
+        const polygon = (radii) => {
+            ctx.beginPath();
+            radii.forEach((r, i) => {
+                const [x, y] = point(i, r);
+                if (i === 0) ctx.moveTo(x, y); else ctx.lineTo(x, y);
+            });
+            ctx.closePath();
+        };
+
+        ctx.strokeStyle = GRID_COLOR;
+        for (let tick = step; tick <= max; tick += step) {
+            polygon(Array(n).fill(radius * tick / max));
+            ctx.stroke();
+        }
+        ctx.fillStyle = TEXT_COLOR;
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'middle';
+        this.data.labels.forEach((label, i) => {
+            const [x, y] = point(i, radius);
+            ctx.beginPath();
+            ctx.moveTo(cx, cy);
+            ctx.lineTo(x, y);
+            ctx.stroke();
+            if (i % 3 === 0) {
+                const [lx, ly] = point(i, radius + 16);
+                ctx.fillText(label, lx, ly);
+            }
+        });
+        for (let tick = 0; tick <= max; tick += step) {
+            ctx.fillText(String(tick), cx, cy - radius * tick / max);
+        }
+
+        polygon(values.map((v) => radius * this.scaled(v)));
+        ctx.fillStyle = fill;
+        ctx.fill();
+        ctx.strokeStyle = stroke;
+        ctx.lineWidth = 2;
+        ctx.stroke();
+    }
+}
+
+// Últimas distâncias ao longo do tempo, eixo y de 0 a max
+class LinePlot extends Plot {
+    draw(ctx, values) {
+        const { max, step, fill, stroke } = this.options;
+        const left = 40, right = this.canvas.width - 10, top = 30, bottom = this.canvas.height - 40;
+        const y = (v) => bottom - (bottom - top) * this.scaled(v);
+        const x = (i) => values.length > 1 ? left + (right - left) * i / (values.length - 1) : left;
+
+        ctx.strokeStyle = GRID_COLOR;
+        ctx.fillStyle = TEXT_COLOR;
+        ctx.textAlign = 'right';
+        ctx.textBaseline = 'middle';
+        for (let tick = 0; tick <= max; tick += step) {
+            ctx.beginPath();
+            ctx.moveTo(left, y(tick));
+            ctx.lineTo(right, y(tick));
+            ctx.stroke();
+            ctx.fillText(String(tick), left - 6, y(tick));
+        }
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'top';
+        const every = Math.max(1, Math.ceil(this.data.labels.length / 5));
+        this.data.labels.forEach((label, i) => {
+            if (i % every === 0) ctx.fillText(label, x(i), bottom + 8);
+        });
+        if (!values.length) return;
+
+        ctx.beginPath();
+        values.forEach((v, i) => {
+            if (i === 0) ctx.moveTo(x(i), y(v)); else ctx.lineTo(x(i), y(v));
+        });
+        ctx.strokeStyle = stroke;
+        ctx.lineWidth = 2;
+        ctx.stroke();
+        ctx.lineTo(x(values.length - 1), bottom);
+        ctx.lineTo(x(0), bottom);
+        ctx.closePath();
+        ctx.fillStyle = fill;
+        ctx.fill();
+    }
+}
@@ -0,0 +1,256 @@
+let radarChart, distanceChart;
+let updateInterval;
+let eventSource;
+let latestReadings = [];
+let cursor = null;  // next_cursor da última página já mostrada (polling)
+// /?device=N: mostrar só esse dispositivo
+const DEVICE = new URLSearchParams(location.search).get('device');
+const DEVICE_QUERY = DEVICE ? '?device=' + encodeURIComponent(DEVICE) : '';
+const DEVICE_PARAM = DEVICE ? '&device=' + encodeURIComponent(DEVICE) : '';
+
+// Inicializar gráficos (static/charts.js)
+function initializeCharts() {
+    radarChart = new RadarPlot(document.getElementById('radarChart'), {
+        label: 'Distância (cm)',
+        labels: Array.from({length: 37}, (_, i) => i * 5 + '°'),
+        data: Array(37).fill(0),
+        max: 200,
+        step: 50,
+        fill: 'rgba(54, 162, 235, 0.2)',
+        stroke: 'rgba(54, 162, 235, 1)'
+    });
+
+    distanceChart = new LinePlot(document.getElementById('distanceChart'), {
+        label: 'Distância (cm)',
+        max: 200,
+        step: 50,
+        fill: 'rgba(255, 99, 132, 0.1)',
+        stroke: 'rgba(255, 99, 132, 1)'
+    });
+}
+
+// Atualizar status
+async function updateDBStatus() {
+    try {
+        const response = await fetch('/api/status');
+        const data = await response.json();
+
+        const dbStatus = document.getElementById('dbStatus');
+        if (data.database === 'postgresql') {
+            dbStatus.className = 'status online';
+            dbStatus.innerHTML = '<div>🗄️ Banco de Dados</div><div>✅ PostgreSQL</div>';
+        } else if (data.database === 'sqlite') {
+            dbStatus.className = 'status online';
+            dbStatus.innerHTML = '<div>🗄️ Banco de Dados</div><div>💾 SQLite local</div>';
+        } else {
+            dbStatus.className = 'status connecting';
+            dbStatus.innerHTML = '<div>🗄️ Banco de Dados</div><div>🔄 Memória</div>';
+        }
+    } catch (error) {
+        document.getElementById('dbStatus').className = 'status offline';
+        document.getElementById('dbStatus').innerHTML = '<div>🗄️ Banco de Dados</div><div>❌ Offline</div>';
+    }
+}
+
+// Buscar dados: a primeira vez as últimas leituras, depois só as novas
+// desde o cursor (todas, por ordem)
+async function fetchData() {
+    try {
+        if (cursor === null) {
+            // Últimas leituras e o cursor logo a seguir a elas, num só pedido
+            const response = await fetch('/api/radar/data?since=latest&limit=10' + DEVICE_PARAM);
+            const page = await response.json();
+            const data = page.readings.reverse();
+
+            latestReadings = data;
+            cursor = page.next_cursor;
+            if (data.length > 0) {
+                updateRadarStatus('online');
+                updateCharts(data[0]);
+                updateTable(data);
+                updateLastUpdate();
+            } else {
+                updateRadarStatus('offline');
+            }
+            return;
+        }
+
+        const response = await fetch('/api/radar/data?since=' + encodeURIComponent(cursor) + '&limit=500' + DEVICE_PARAM);
+        if (response.status === 410) {
+            // Cursor de outro engine ou de antes de um reinício do servidor
+            cursor = null;
+            return fetchData();
+        }
+        const page = await response.json();
+        cursor = page.next_cursor;
+        if (page.readings.length > 0) {
+            page.readings.forEach(reading => {
+                latestReadings.unshift(reading);
+                updateCharts(reading);
+            });
+            latestReadings = latestReadings.slice(0, 10);
+            updateRadarStatus('online');
+            updateTable(latestReadings);
+            updateLastUpdate();
+        }
+    } catch (error) {
+        updateRadarStatus('offline');
+    }
+}
+
+// Receber leituras em tempo real (Server-Sent Events)
+function connectStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    eventSource = new EventSource('/api/radar/stream' + DEVICE_QUERY);
+    eventSource.addEventListener('reading', function(event) {
+        const reading = JSON.parse(event.data);
+        latestReadings.unshift(reading);
+        latestReadings = latestReadings.slice(0, 10);
+        updateRadarStatus('online');
+        updateCharts(reading);
+        updateTable(latestReadings);
+        updateLastUpdate();
+    });
+    eventSource.addEventListener('reset', function() {
+        radarChart.data.datasets[0].data = Array(37).fill(0);
+        cursor = null;
+        loadSweep();
+        fetchData();
+    });
+    eventSource.onopen = stopPolling;
+    // O EventSource reconecta sozinho; até lá, voltar ao polling
+    eventSource.onerror = startPolling;
+}
+
+function startPolling() {
+    if (!updateInterval) {
+        // O stream pode ter mostrado leituras depois do cursor: recomeçar
+        // pelas últimas em vez de as repetir
+        cursor = null;
+        updateInterval = setInterval(fetchData, 3000);
+    }
+}
+
+function stopPolling() {
+    if (updateInterval) {
+        clearInterval(updateInterval);
+        updateInterval = null;
+    }
+}
+
+// Carregar o varrimento completo atual num único request
+async function loadSweep() {
+    try {
+        const response = await fetch('/api/radar/sweep' + DEVICE_QUERY);
+        const sweep = await response.json();
+        sweep.bins.forEach(bin => {
+            const angleIndex = Math.floor(bin.angle / 5);
+            if (bin.distance !== null && angleIndex >= 0 && angleIndex < 37) {
+                radarChart.data.datasets[0].data[angleIndex] = bin.distance;
+            }
+        });
+        radarChart.update();
+    } catch (error) {
+        console.warn('Falha ao carregar varrimento', error);
+    }
+}
+
+function updateRadarStatus(status) {
+    const radarStatus = document.getElementById('radarStatus');
+    if (status === 'online') {
+        radarStatus.className = 'status online';
+        radarStatus.innerHTML = '<div>📡 Radar</div><div>✅ Recebendo dados</div>';
+    } else {
+        radarStatus.className = 'status offline';
+        radarStatus.innerHTML = '<div>📡 Radar</div><div>❌ Sem dados</div>';
+    }
+}
+
+function updateLEDStatus(distance) {
+    const ledStatus = document.getElementById('ledStatus');
+    if (distance < 30) {
+        ledStatus.className = 'status offline';
+        ledStatus.innerHTML = '<div>💡 LED RGB</div><div>🔴 Objeto Detectado</div>';
+    } else {
+        ledStatus.className = 'status online';
+        ledStatus.innerHTML = '<div>💡 LED RGB</div><div>🟢 Área Livre</div>';
+    }
+}
+
+function updateCharts(latestData) {
+    if (!latestData) return;
+
+    updateLEDStatus(latestData.distance);
+
+    // Radar
+    const angleIndex = Math.floor(latestData.angle / 5);
+    if (angleIndex >= 0 && angleIndex < 37) {
+        radarChart.data.datasets[0].data[angleIndex] = latestData.distance;
+        radarChart.update();
+    }
+
+    // Linha
+    const time = new Date().toLocaleTimeString();
+    distanceChart.data.labels.push(time);
+    distanceChart.data.datasets[0].data.push(latestData.distance);
+
+    if (distanceChart.data.labels.length > 20) {
+        distanceChart.data.labels.shift();
+        distanceChart.data.datasets[0].data.shift();
+    }
+    distanceChart.update();
+}
+
+function updateTable(data) {
+    const tableBody = document.getElementById('readingsTable');
+    tableBody.innerHTML = '';
+
+    data.slice(0, 10).forEach(item => {
+        const row = document.createElement('tr');
+        const time = new Date(item.created_at || Date.now()).toLocaleTimeString();
+
+        row.innerHTML = `
+            <td>${item.angle}°</td>
+            <td>${item.distance} cm</td>
+            <td>${item.timestamp}</td>
+            <td>${time}</td>
+        `;
+        tableBody.appendChild(row);
+    });
+}
+
+function updateLastUpdate() {
+    document.getElementById('lastUpdate').textContent = 
+        `Última atualização: ${new Date().toLocaleTimeString()}`;
+}
+
+async function clearData() {
+    if (!confirm('Limpar todos os dados?')) return;
+    try {
+        await fetch('/api/radar/clear', {method: 'DELETE'});
+        alert('Dados limpos!');
+        location.reload();
+    } catch (error) {
+        alert('Erro ao limpar dados.');
+    }
+}
+
+async function testConnection() {
+    await updateDBStatus();
+    await fetchData();
+    alert('Teste de conexão concluído!');
+}
+
+// Inicializar
+document.addEventListener('DOMContentLoaded', function() {
+    initializeCharts();
+    updateDBStatus();
+    loadSweep();
+    fetchData();
+
+    // Atualizações em tempo real (polling a cada 3 segundos se o stream falhar)
+    connectStream();
+});
@@ -0,0 +1,206 @@
+import argparse
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Preferência na negociação (a primeira aceite pelo cliente ganha)
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Níveis para ficheiros estáticos (comprimidos uma vez) e para respostas
+# dinâmicas (comprimidas por pedido ou por entrada do cache)
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+TEMPLATE_TAG = re.compile(r"""\{\{\s*static\(\s*['"]([^'"]+)['"]\s*\)\s*\}\}""")
+
+
+def compress(data, encoding, levels=DYNAMIC_LEVELS):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    # mtime=0: mesma entrada, mesmos bytes (ETag estável entre processos)
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def compress_stream(chunks, encoding, levels=DYNAMIC_LEVELS):
+    """Comprime um iterador de bytes à medida que é consumido (respostas em stream)."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=levels['br'])
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(levels['gzip'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def negotiate(accept_encodings, encodings=ENCODINGS):
+    """Primeira codificação de ``encodings`` aceite (q > 0) pelo cliente, ou None.
+
+    ``accept_encodings`` é o ``request.accept_encodings`` do Werkzeug.
+    """
+    for encoding in encodings:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+class Asset:
+    """Ficheiro estático em memória com ETag e variantes comprimidas.
+
+    As variantes vêm de ``<ficheiro>.br``/``.gz`` gerados no build (ver
+    ``python static_assets.py``) ou são comprimidas no primeiro pedido que as
+    aceita e guardadas.
+    """
+
+    __slots__ = ('name', 'path', 'body', 'mimetype', 'digest', 'url', '_encoded', '_lock')
+
+    def __init__(self, name, path, body, prefix):
+        self.name = name
+        self.path = path
+        self.body = body
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.url = f'{prefix}{stem}.{self.digest}{ext}'
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        """Corpo na codificação pedida (None = sem compressão)."""
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = self._load_precompressed(encoding) or compress(self.body, encoding, STATIC_LEVELS)
+                    self._encoded[encoding] = data
+        return data
+
+    def _load_precompressed(self, encoding):
+        if self.path is None:
+            return None
+        path = self.path + SUFFIXES[encoding]
+        try:
+            # Ficheiro do build mais antigo que a fonte: ignorar
+            if os.path.getmtime(path) < os.path.getmtime(self.path):
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+class AssetBundle:
+    """Ficheiros de ``directory`` servidos em ``prefix`` com o hash no nome.
+
+    ``dashboard.js`` fica em ``/static/dashboard.<hash>.js``: o URL muda com o
+    conteúdo, por isso pode ser guardado em cache para sempre. Os ``.html``
+    são templates onde ``{{ static('nome') }}`` vira esse URL.
+    Tudo é lido no primeiro uso, não no import.
+    """
+
+    def __init__(self, directory, prefix='/static/'):
+        self.directory = directory
+        self.prefix = prefix
+        self._assets = None
+        self._by_url = None
+        self._lock = threading.Lock()
+
+    def _load_locked(self):
+        assets, templates = {}, []
+        for root, dirs, files in os.walk(self.directory):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.endswith(tuple(SUFFIXES.values())) or filename.startswith('.'):
+                    continue
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                if name.endswith('.html'):
+                    templates.append((name, path))
+                    continue
+                with open(path, 'rb') as f:
+                    assets[name] = Asset(name, path, f.read(), self.prefix)
+
+        def url(match):
+            name = match.group(1)
+            if name in assets:
+                return assets[name].url
+            raise KeyError(f"asset inexistente: {name}")
+
+        for name, path in templates:
+            with open(path, encoding='utf-8') as f:
+                body = TEMPLATE_TAG.sub(url, f.read()).encode()
+            # O HTML renderizado não corresponde a um ficheiro: sem .br/.gz do build
+            assets[name] = Asset(name, None, body, self.prefix)
+
+        self._assets = assets
+        self._by_url = {asset.url[len(self.prefix):]: asset for asset in assets.values()}
+
+    def _ensure_loaded(self):
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self._load_locked()
+
+    def get(self, name):
+        """(asset, versionado) para um nome com ou sem hash; (None, False) se não existir."""
+        self._ensure_loaded()
+        asset = self._by_url.get(name)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(name), False
+
+    def url(self, name):
+        self._ensure_loaded()
+        asset = self._assets.get(name)
+        return asset.url if asset is not None else None
+
+
+def precompress(directory, encodings=ENCODINGS):
+    """Gera ``.br``/``.gz`` ao lado de cada ficheiro (passo de build opcional)."""
+    written = []
+    for root, dirs, files in os.walk(directory):
+        for filename in files:
+            if filename.endswith(tuple(SUFFIXES.values())) or filename.endswith('.html'):
+                continue
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as f:
+                body = f.read()
+            for encoding in encodings:
+                with open(path + SUFFIXES[encoding], 'wb') as f:
+                    f.write(compress(body, encoding, STATIC_LEVELS))
+                written.append(path + SUFFIXES[encoding])
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pré-comprimir os ficheiros estáticos do dashboard')
+    parser.add_argument('directory', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    for path in precompress(args.directory):
+        logger.info(f"🗜️ {path}")
+
+
+if __name__ == '__main__':
+    main()
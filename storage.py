@@ -0,0 +1,953 @@
+"""Engines de armazenamento das leituras do radar.
+
+Todos expõem a mesma interface (``StorageEngine``); o index.py escolhe o
+engine por variável de ambiente e cai no engine local quando o PostgreSQL
+não responde.
+"""
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timedelta
+import heapq
+from itertools import islice
+import logging
+from operator import itemgetter
+import os
+import sqlite3
+import threading
+import time
+
+from aggregate import aggregate_columns, aggregate_sql
+import migrations
+from retention import run_retention
+from ring_buffer import NO_TIMESTAMP, RadarRingBuffer
+from shared_ring import SCAN_CHUNK, SharedRingBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class StorageUnavailable(Exception):
+    """O engine não tem conexão de momento (usar o engine local)."""
+
+
+class DeviceLimitExceeded(Exception):
+    """O engine não aceita mais dispositivos (limite de memória)."""
+
+
+# Dispositivos conhecidos sem ler as leituras: "loose index scan" recursivo
+# sobre (device_id, created_at), um salto no índice por dispositivo; para
+# cada um, a última leitura e quantas chegaram desde {since}. O mesmo SQL
+# serve ao PostgreSQL e ao SQLite (só muda o marcador do parâmetro).
+DEVICES_SQL = '''
+    WITH RECURSIVE devices (device_id) AS (
+        SELECT min(device_id) FROM radar_data
+        UNION ALL
+        SELECT (SELECT min(r.device_id) FROM radar_data r WHERE r.device_id > d.device_id)
+        FROM devices d
+        WHERE d.device_id IS NOT NULL
+    )
+    SELECT d.device_id,
+           (SELECT max(r.created_at) FROM radar_data r WHERE r.device_id = d.device_id),
+           (SELECT count(*) FROM radar_data r
+            WHERE r.device_id = d.device_id AND r.created_at >= {since})
+    FROM devices d
+    WHERE d.device_id IS NOT NULL
+    ORDER BY d.device_id
+'''
+
+# Sincronização por cursor (id) no PostgreSQL. Os ids são reservados no
+# INSERT mas só ficam visíveis no COMMIT, e transações concorrentes não
+# terminam por ordem de id: devolver um id depois de outro ainda invisível
+# faria o cliente avançar o cursor e nunca o ver. Por isso as escritas
+# seguram este advisory lock partilhado até ao fim da transação, e a leitura
+# toma-o em exclusivo só o tempo de ler o último valor da sequence: todos os
+# ids até aí já estão gravados (ou nunca vão existir).
+SYNC_LOCK_KEY = 7261002
+
+
+# Colunas de cada linha de ``StorageEngine.export``
+EXPORT_COLUMNS = ('id', 'angle', 'distance', 'timestamp', 'device_id', 'created_at')
+
+
+class Pages:
+    """Iterador de páginas de leituras que liberta o cursor/conexão em ``close()``.
+
+    ``close`` corre no fim da iteração, num erro, ou quando quem consome
+    desiste (ex: o cliente fecha a ligação), mesmo antes da primeira página.
+    """
+
+    def __init__(self, pages, close=None):
+        self._pages = pages
+        self._close = close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._pages)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        close, self._close = self._close, None
+        if close is not None:
+            close()
+
+
+class StorageEngine:
+    name = None
+    durable = False  # sobrevive a um reinício do processo
+    # Muda quando outro processo altera as leituras (invalida o cache de
+    # respostas); None quando só este processo escreve no engine
+    version = None
+    # Maior lote que ``save`` guarda por inteiro; None sem limite
+    max_batch = None
+
+    @property
+    def epoch(self):
+        """Identifica a sequência de ``id``: um cursor de outro epoch não é comparável."""
+        return self.name
+
+    # Leituras: tuplos (angle, distance, timestamp, device_id). Nas leituras,
+    # ``device=None`` junta todos os dispositivos; com um device_id só esse
+    # dispositivo é lido (índice ou shard próprio).
+
+    def save(self, rows, received_at=None):
+        """Grava ``rows`` [(angle, distance, timestamp, device_id), ...] numa transação."""
+        raise NotImplementedError
+
+    def restore(self, records):
+        """Grava [(angle, distance, timestamp, received_at, device_id), ...] com a hora de receção original."""
+        raise NotImplementedError
+
+    def latest(self, limit, device=None):
+        """Últimas leituras como dicts, da mais recente para a mais antiga."""
+        raise NotImplementedError
+
+    def recent(self, limit, device=None):
+        """Últimas leituras como (angle, distance, epoch), da mais antiga para a mais recente."""
+        raise NotImplementedError
+
+    def since(self, cursor, limit, device=None):
+        """Até ``limit`` leituras com ``id`` > ``cursor`` como dicts, por ordem de ``id``.
+
+        O ``id`` é crescente e nunca reutilizado (nem depois de ``clear``); uma
+        leitura só aparece quando já não pode surgir outra com ``id`` menor.
+        """
+        raise NotImplementedError
+
+    def last_id(self):
+        """Maior ``id`` que ``since`` já pode devolver (0 sem leituras)."""
+        raise NotImplementedError
+
+    def aggregate(self, start, end, bucket, angle=None, device=None):
+        raise NotImplementedError
+
+    def export(self, start, end, device=None, page_size=2000):
+        """Leituras recebidas em [start, end) por ordem de receção, em páginas.
+
+        Devolve ``Pages`` com listas de até ``page_size`` tuplos (ver
+        ``EXPORT_COLUMNS``, ``created_at`` em ISO 8601). Só uma página de cada
+        vez fica em memória; o erro de conexão surge já nesta chamada.
+        """
+        raise NotImplementedError
+
+    def devices(self, since):
+        """[(device_id, última receção em epoch, leituras desde ``since``), ...] por device_id."""
+        raise NotImplementedError
+
+    def admit(self, device_ids):
+        """Garante lugar para ``device_ids`` antes de gravar (ou levanta DeviceLimitExceeded)."""
+
+    def clear(self):
+        raise NotImplementedError
+
+    def retain(self, keep, chunk_size, summary_keep=None):
+        """Remove as leituras mais antigas que ``keep``; None se não se aplica."""
+        return None
+
+    def stats(self):
+        return {'engine': self.name}
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch).isoformat() if epoch is not None else None
+
+
+class MemoryEngine(StorageEngine):
+    """Buffers circulares em memória (RadarRingBuffer), um por dispositivo:
+    rápido, mas volátil.
+
+    Cada shard tem o seu lock e até ``capacity`` leituras (alocadas conforme
+    chegam), por isso um dispositivo não apaga o histórico de outro e as
+    leituras não disputam as escritas; os pedidos com ``device`` só tocam na
+    shard desse dispositivo. Há no máximo ``max_devices`` shards: a memória
+    fica limitada a ``max_devices * capacity`` leituras. O ``id`` de
+    cada leitura vem de um contador único, atribuído com a escrita sob um
+    lock próprio: ``since`` só devolve ids até ao último lote completo. O
+    contador recomeça em cada processo, por isso o ``epoch`` também.
+    """
+
+    name = 'memory'
+
+    def __init__(self, capacity=100000, max_devices=16):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._next_seq = 1
+        self._committed_seq = 0
+        self._epoch = format(int(time.time() * 1000), 'x')
+
+    @property
+    def epoch(self):
+        return f'{self.name}.{self._epoch}'
+
+    def shard(self, device_id):
+        buffer = self._shards.get(device_id)
+        if buffer is None:
+            self.admit([device_id])
+            buffer = self._shards[device_id]
+        return buffer
+
+    # Criar as shards em falta de uma vez: ou cabem todas ou nenhuma
+    def admit(self, device_ids):
+        missing = [d for d in device_ids if d not in self._shards]
+        if not missing:
+            return
+        with self._lock:
+            missing = [d for d in dict.fromkeys(missing) if d not in self._shards]
+            if len(self._shards) + len(missing) > self.max_devices:
+                raise DeviceLimitExceeded(
+                    f'Limite de {self.max_devices} dispositivos em memória atingido')
+            for device_id in missing:
+                self._shards[device_id] = RadarRingBuffer(self.capacity, device_id)
+
+    def _selected(self, device):
+        if device is None:
+            return list(self._shards.values())
+        buffer = self._shards.get(device)
+        return [buffer] if buffer is not None else []
+
+    def save(self, rows, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        by_device = {}
+        for row in rows:
+            by_device.setdefault(row[3], []).append(row)
+        self.admit(by_device)
+        with self._write_lock:
+            seq = self._next_seq
+            for device_id, device_rows in by_device.items():
+                self.shard(device_id).extend(device_rows, received_at, range(seq, seq + len(device_rows)))
+                seq += len(device_rows)
+            self._next_seq = seq
+            self._committed_seq = seq - 1
+
+    def latest(self, limit, device=None):
+        shards = self._selected(device)
+        if len(shards) == 1:
+            return shards[0].latest(limit)
+        merged = heapq.merge(*(buffer.latest(limit) for buffer in shards),
+                             key=itemgetter('created_at'), reverse=True)
+        return list(islice(merged, limit))
+
+    def recent(self, limit, device=None):
+        per_shard = []
+        for buffer in self._selected(device):
+            views = buffer.views(limit)
+            per_shard.append(list(zip(*(
+                [x for seg in views[name] for x in seg]
+                for name in ('angle', 'distance', 'received_at')
+            ))))
+        if len(per_shard) == 1:
+            return per_shard[0]
+        return list(heapq.merge(*per_shard, key=itemgetter(2)))[-limit:]
+
+    def since(self, cursor, limit, device=None):
+        until = self._committed_seq
+        shards = self._selected(device)
+        if len(shards) == 1:
+            return shards[0].since(cursor, limit, until)
+        merged = heapq.merge(*(buffer.since(cursor, limit, until) for buffer in shards),
+                             key=itemgetter('id'))
+        return list(islice(merged, limit))
+
+    def last_id(self):
+        return self._committed_seq
+
+    # Cada shard é lida por páginas (seq da última linha como cursor, sem
+    # copiar o intervalo) e as shards são intercaladas por hora de receção
+    def export(self, start, end, device=None, page_size=2000):
+        start, end = start.timestamp(), end.timestamp()
+
+        def shard_rows(buffer):
+            seq = 0
+            while True:
+                page = buffer.between(start, end, seq, page_size)
+                if not page:
+                    return
+                yield from page
+                seq = page[-1][0]
+
+        rows = heapq.merge(*(shard_rows(buffer) for buffer in self._selected(device)), key=itemgetter(5))
+
+        def pages():
+            while True:
+                page = list(islice(rows, page_size))
+                if not page:
+                    return
+                yield [(*row[:5], _iso(row[5])) for row in page]
+
+        return Pages(pages())
+
+    def aggregate(self, start, end, bucket, angle=None, device=None):
+        columns = {'angle': [], 'distance': [], 'received_at': []}
+        for buffer in self._selected(device):
+            views = buffer.views(len(buffer))
+            for name, segments in columns.items():
+                segments.extend(views[name])
+        return aggregate_columns(columns, start, end, bucket, angle)
+
+    def devices(self, since):
+        result = []
+        for device_id, buffer in sorted(self._shards.items()):
+            last_seen = buffer.last_received_at
+            if last_seen is None:
+                continue
+            # received_at cresce ao longo de cada segmento: bisect em vez de varrer
+            received = sum(len(seg) - bisect_left(seg, since)
+                           for seg in buffer.views(len(buffer))['received_at'])
+            result.append((device_id, last_seen, received))
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._shards = {}
+
+    def stats(self):
+        shards = list(self._shards.values())
+        return {
+            'engine': self.name,
+            'devices': len(shards),
+            'max_devices': self.max_devices,
+            'size': sum(len(buffer) for buffer in shards),
+            'capacity': self.capacity,
+            'bytes': sum(buffer.nbytes for buffer in shards),
+        }
+
+
+class SharedMemoryEngine(StorageEngine):
+    """Buffer circular partilhado pelos workers do servidor (SharedRingBuffer).
+
+    Como o engine 'memory', mas num ficheiro mapeado em memória (por omissão
+    em ``/dev/shm``): com vários workers (gunicorn ``-w N``) todos gravam e
+    leem as mesmas leituras, e um worker reiniciado encontra-as lá. Um só
+    buffer para todos os dispositivos; o ``id`` é o seq do registo. Perde-se
+    ao reiniciar a máquina.
+    """
+
+    name = 'shared'
+    durable = True
+
+    def __init__(self, path, capacity=1000000):
+        self.buffer = SharedRingBuffer(path, capacity)
+
+    @property
+    def version(self):
+        return self.buffer.version
+
+    # O ficheiro novo (ex: depois de reiniciar a máquina) recomeça os seqs
+    @property
+    def epoch(self):
+        return f'{self.name}.{self.buffer.epoch:x}'
+
+    @property
+    def max_batch(self):
+        return self.buffer.capacity
+
+    # Blocos de registos [first, last] (todos ou só de ``device``); sem
+    # filtro, ``limit`` chega para o primeiro bloco
+    def _chunks(self, first, last, device=None, reverse=False, limit=None):
+        size = limit if device is None and limit else SCAN_CHUNK
+        for chunk in self.buffer.scan(first, last, reverse, min(size, SCAN_CHUNK)):
+            if device is not None:
+                chunk = chunk[chunk['device_id'] == device]
+            if len(chunk):
+                yield chunk[::-1] if reverse else chunk
+
+    @staticmethod
+    def _rows(chunk):
+        return [{
+            'id': seq,
+            'angle': angle,
+            'distance': distance,
+            'timestamp': None if timestamp == NO_TIMESTAMP else timestamp,
+            'device_id': device_id,
+            'created_at': _iso(received_at),
+        } for seq, received_at, timestamp, distance, angle, device_id in chunk.tolist()]
+
+    def save(self, rows, received_at=None):
+        self.buffer.extend(rows, time.time() if received_at is None else received_at)
+
+    def restore(self, records):
+        self.buffer.extend([(r[0], r[1], r[2], r[4]) for r in records], [r[3] for r in records])
+
+    # Últimos ``limit`` registos, do mais recente para o mais antigo
+    def _latest_records(self, limit, device=None):
+        import numpy as np
+
+        chunks, found = [], 0
+        for chunk in self._chunks(*self.buffer.live_range(), device, reverse=True, limit=limit):
+            chunks.append(chunk[:limit - found])
+            found += len(chunks[-1])
+            if found >= limit:
+                break
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=self.buffer.dtype)
+
+    def latest(self, limit, device=None):
+        return self._rows(self._latest_records(limit, device))
+
+    def recent(self, limit, device=None):
+        records = self._latest_records(limit, device)[::-1]
+        return list(zip(records['angle'].tolist(), records['distance'].tolist(),
+                        records['received_at'].tolist()))
+
+    def since(self, cursor, limit, device=None):
+        first, last = self.buffer.live_range()
+        result = []
+        for chunk in self._chunks(max(first, cursor + 1), last, device, limit=limit):
+            result.extend(self._rows(chunk[:limit - len(result)]))
+            if len(result) >= limit:
+                break
+        return result
+
+    def last_id(self):
+        return self.buffer.committed
+
+    # Por ordem de seq (ordem de escrita no buffer), página a página
+    def export(self, start, end, device=None, page_size=2000):
+        start, end = start.timestamp(), end.timestamp()
+        first, last = self.buffer.live_range()
+
+        def rows():
+            for chunk in self._chunks(first, last, device):
+                chunk = chunk[(chunk['received_at'] >= start) & (chunk['received_at'] < end)]
+                for seq, received_at, timestamp, distance, angle, device_id in chunk.tolist():
+                    yield (seq, angle, distance, None if timestamp == NO_TIMESTAMP else timestamp,
+                           device_id, _iso(received_at))
+
+        def pages():
+            iterator = rows()
+            while True:
+                page = list(islice(iterator, page_size))
+                if not page:
+                    return
+                yield page
+
+        return Pages(pages())
+
+    def aggregate(self, start, end, bucket, angle=None, device=None):
+        columns = {'angle': [], 'distance': [], 'received_at': []}
+        for chunk in self._chunks(*self.buffer.live_range(), device):
+            for name, segments in columns.items():
+                segments.append(chunk[name])
+        return aggregate_columns(columns, start, end, bucket, angle)
+
+    def devices(self, since):
+        import numpy as np
+
+        last_seen, received = {}, {}
+        for chunk in self._chunks(*self.buffer.live_range()):
+            ids, inverse = np.unique(chunk['device_id'], return_inverse=True)
+            latest = np.full(len(ids), -np.inf)
+            np.maximum.at(latest, inverse, chunk['received_at'])
+            counts = np.bincount(inverse, chunk['received_at'] >= since, len(ids))
+            for device_id, t, n in zip(ids.tolist(), latest.tolist(), counts.tolist()):
+                last_seen[device_id] = max(t, last_seen.get(device_id, t))
+                received[device_id] = received.get(device_id, 0) + int(n)
+        return [(device_id, last_seen[device_id], received[device_id]) for device_id in sorted(last_seen)]
+
+    def clear(self):
+        self.buffer.clear()
+
+    def stats(self):
+        return {
+            'engine': self.name,
+            'path': self.buffer.path,
+            'size': len(self.buffer),
+            'capacity': self.buffer.capacity,
+            'bytes': self.buffer.nbytes,
+            'dropped': self.buffer.dropped,
+        }
+
+
+class PostgresEngine(StorageEngine):
+    """PostgreSQL via o pool do index.py; ``connect`` devolve None sem servidor."""
+
+    name = 'postgresql'
+    durable = True
+
+    def __init__(self, connect, days_ahead=3, retention_days=0, page_size=1000):
+        self._connect = connect
+        self.days_ahead = days_ahead
+        self.retention_days = retention_days
+        self.page_size = page_size
+        self.partitioned = False
+        self.partitions_checked_on = None
+
+    @contextmanager
+    def connection(self):
+        conn = self._connect()
+        if not conn:
+            raise StorageUnavailable('PostgreSQL não disponível')
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def migrate(self, partitioned=False):
+        with self.connection() as conn:
+            applied = migrations.migrate(conn, partitioned=partitioned)
+            self.partitioned = migrations.is_partitioned(conn)
+            if self.partitioned:
+                self.maintain_partitions(conn)
+        return applied
+
+    # Manutenção das partições diárias (uma vez por dia por processo)
+    def maintain_partitions(self, conn):
+        today = date.today()
+        if self.partitions_checked_on == today:
+            return
+        migrations.ensure_partitions(conn, self.days_ahead, today)
+        if self.retention_days > 0:
+            migrations.drop_partitions_before(conn, today - timedelta(days=self.retention_days))
+        self.partitions_checked_on = today
+
+    def save(self, rows, received_at=None):
+        from psycopg2.extras import execute_values
+        with self.connection() as conn:
+            if self.partitioned:
+                self.maintain_partitions(conn)
+            cur = conn.cursor()
+            cur.execute('SELECT pg_advisory_xact_lock_shared(%s)', (SYNC_LOCK_KEY,))
+            execute_values(
+                cur,
+                'INSERT INTO radar_data (angle, distance, timestamp, device_id) VALUES %s',
+                rows,
+                page_size=self.page_size
+            )
+            conn.commit()
+            cur.close()
+
+    def restore(self, records):
+        from psycopg2.extras import execute_values
+        with self.connection() as conn:
+            if self.partitioned:
+                self.maintain_partitions(conn)
+            cur = conn.cursor()
+            cur.execute('SELECT pg_advisory_xact_lock_shared(%s)', (SYNC_LOCK_KEY,))
+            execute_values(
+                cur,
+                'INSERT INTO radar_data (angle, distance, timestamp, created_at, device_id) VALUES %s',
+                [(angle, distance, timestamp, datetime.fromtimestamp(received_at), device_id)
+                 for angle, distance, timestamp, received_at, device_id in records],
+                page_size=self.page_size
+            )
+            conn.commit()
+            cur.close()
+
+    def _latest_rows(self, limit, device=None):
+        where, params = ('WHERE device_id = %s', (device, limit)) if device is not None else ('', (limit,))
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f'''
+                SELECT id, angle, distance, timestamp, device_id, created_at
+                FROM radar_data
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            ''', params)
+            results = cur.fetchall()
+            cur.close()
+        return results
+
+    @staticmethod
+    def _row(r):
+        return {
+            'id': r[0], 'angle': r[1], 'distance': r[2], 'timestamp': r[3], 'device_id': r[4],
+            'created_at': r[5].isoformat() if r[5] else None
+        }
+
+    def latest(self, limit, device=None):
+        return [self._row(r) for r in self._latest_rows(limit, device)]
+
+    def recent(self, limit, device=None):
+        return [(angle, distance, created_at.timestamp() if created_at else None)
+                for _, angle, distance, _, _, created_at in reversed(self._latest_rows(limit, device))]
+
+    def since(self, cursor, limit, device=None):
+        device_filter, params = ('AND device_id = %s', (device,)) if device is not None else ('', ())
+        with self.connection() as conn:
+            until = self._committed_id(conn)
+            cur = conn.cursor()
+            cur.execute(f'''
+                SELECT id, angle, distance, timestamp, device_id, created_at
+                FROM radar_data
+                WHERE id > %s AND id <= %s {device_filter}
+                ORDER BY id
+                LIMIT %s
+            ''', (cursor, until, *params, limit))
+            rows = cur.fetchall()
+            cur.close()
+        return [self._row(r) for r in rows]
+
+    # Último id atribuído, depois de esperar pelas escritas em curso (o
+    # COMMIT larga o lock logo a seguir)
+    @staticmethod
+    def _committed_id(conn):
+        cur = conn.cursor()
+        cur.execute('SELECT pg_advisory_xact_lock(%s)', (SYNC_LOCK_KEY,))
+        cur.execute('SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM radar_data_id_seq')
+        until = cur.fetchone()[0]
+        cur.close()
+        conn.commit()
+        return until
+
+    def last_id(self):
+        with self.connection() as conn:
+            return self._committed_id(conn)
+
+    def aggregate(self, start, end, bucket, angle=None, device=None):
+        with self.connection() as conn:
+            return aggregate_sql(conn, start, end, bucket, angle, device=device)
+
+    # Cursor do lado do servidor (DECLARE … CURSOR): o resultado fica no
+    # PostgreSQL e chega em FETCH de ``page_size`` linhas. A conexão fica
+    # ocupada até ao fim da exportação
+    def export(self, start, end, device=None, page_size=2000):
+        device_filter, params = ('AND device_id = %s', (device,)) if device is not None else ('', ())
+        conn = self._connect()
+        if not conn:
+            raise StorageUnavailable('PostgreSQL não disponível')
+        try:
+            cur = conn.cursor(name='radar_export')
+            cur.execute(f'''
+                SELECT id, angle, distance, timestamp, device_id, created_at
+                FROM radar_data
+                WHERE created_at >= %s AND created_at < %s {device_filter}
+                ORDER BY created_at
+            ''', (start, end, *params))
+        except Exception:
+            conn.close()
+            raise
+
+        def pages():
+            while True:
+                page = cur.fetchmany(page_size)
+                if not page:
+                    return
+                yield [(*r[:5], r[5].isoformat() if r[5] else None) for r in page]
+
+        def close():
+            try:
+                cur.close()
+            except Exception:
+                pass  # conexão perdida: o pool descarta-a
+            conn.close()
+
+        return Pages(pages(), close)
+
+    def devices(self, since):
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(DEVICES_SQL.format(since='%(since)s'), {'since': datetime.fromtimestamp(since)})
+            rows = cur.fetchall()
+            cur.close()
+        return [(device_id, last_seen.timestamp() if last_seen else None, received)
+                for device_id, last_seen, received in rows]
+
+    def clear(self):
+        with self.connection() as conn:
+            if self.partitioned:
+                # Remover partições em vez de DELETE linha a linha
+                migrations.clear_partitioned(conn, self.days_ahead)
+                self.partitions_checked_on = date.today()
+            else:
+                cur = conn.cursor()
+                cur.execute('DELETE FROM radar_data')
+                # Senão o histórico agregado continuaria a mostrar os resumos
+                cur.execute('DELETE FROM radar_data_minute')
+                conn.commit()
+                cur.close()
+
+    def retain(self, keep, chunk_size, summary_keep=None):
+        with self.connection() as conn:
+            return run_retention(conn, keep, chunk_size, summary_keep)
+
+    def stats(self):
+        return {'engine': self.name, 'partitioned': self.partitioned}
+
+
+class SQLiteEngine(StorageEngine):
+    """SQLite embebido em modo WAL: armazenamento local durável sem servidor.
+
+    Leitores e o escritor não se bloqueiam (WAL); as escritas de um lote são
+    uma única transação com o mesmo INSERT preparado (cache de statements de
+    cada conexão). As conexões são reaproveitadas entre pedidos; o ficheiro só
+    é aberto (e o schema verificado) na primeira utilização.
+    """
+
+    name = 'sqlite'
+    durable = True
+
+    # (versão, comandos SQL), guardada em PRAGMA user_version. Mesmo schema
+    # e índices que radar_data no PostgreSQL; created_at em segundos epoch.
+    # Nunca alterar uma versão já publicada: acrescentar uma nova.
+    MIGRATIONS = [
+        (1, [
+            '''
+            CREATE TABLE IF NOT EXISTS radar_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                angle INTEGER NOT NULL,
+                distance INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_radar_data_created_at ON radar_data (created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_radar_data_angle_created_at ON radar_data (angle, created_at)',
+        ]),
+        (2, [
+            'ALTER TABLE radar_data ADD COLUMN device_id INTEGER NOT NULL DEFAULT 0',
+            'CREATE INDEX IF NOT EXISTS idx_radar_data_device_created_at ON radar_data (device_id, created_at)',
+        ]),
+        (3, [
+            'CREATE INDEX IF NOT EXISTS idx_radar_data_device_id ON radar_data (device_id, id)',
+        ]),
+    ]
+
+    # Mesma ordem de colunas que os registos do journal (restore sem cópia)
+    INSERT_SQL = '''
+        INSERT INTO radar_data (angle, distance, timestamp, created_at, device_id)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, path, synchronous='NORMAL', busy_timeout=5.0):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # um escritor por processo (sem SQLITE_BUSY)
+        self._schema_lock = threading.Lock()
+        self._ready = False
+        self._pid = os.getpid()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._idle_lock:
+            if self._pid != os.getpid():
+                # Processo filho (fork): não reutilizar as conexões do pai
+                self._idle, self._pid = [], os.getpid()
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        if not self._ready:
+            with self._schema_lock:
+                if not self._ready:
+                    self._migrate(conn)
+                    self._ready = True
+        broken = False
+        try:
+            yield conn
+        except sqlite3.Error:
+            broken = True
+            raise
+        finally:
+            if broken:
+                conn.close()
+            else:
+                with self._idle_lock:
+                    self._idle.append(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self._write_lock, self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _migrate(self, conn):
+        applied = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, steps in self.MIGRATIONS:
+                if target <= version:
+                    continue
+                logger.info(f"🔧 SQLite: aplicando migração {target}")
+                for sql in steps:
+                    conn.execute(sql)
+                conn.execute(f'PRAGMA user_version = {int(target)}')
+                applied.append(target)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return applied
+
+    def save(self, rows, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        with self.transaction() as conn:
+            conn.executemany(self.INSERT_SQL, [
+                (angle, distance, timestamp, received_at, device_id)
+                for angle, distance, timestamp, device_id in rows
+            ])
+
+    def restore(self, records):
+        with self.transaction() as conn:
+            conn.executemany(self.INSERT_SQL, records)
+
+    def _latest_rows(self, limit, device=None):
+        where, params = ('WHERE device_id = ?', (device, limit)) if device is not None else ('', (limit,))
+        with self.connection() as conn:
+            return conn.execute(f'''
+                SELECT id, angle, distance, timestamp, device_id, created_at
+                FROM radar_data
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', params).fetchall()
+
+    @staticmethod
+    def _row(r):
+        return {
+            'id': r[0], 'angle': r[1], 'distance': r[2], 'timestamp': r[3], 'device_id': r[4],
+            'created_at': _iso(r[5])
+        }
+
+    def latest(self, limit, device=None):
+        return [self._row(r) for r in self._latest_rows(limit, device)]
+
+    def recent(self, limit, device=None):
+        return [(angle, distance, created_at)
+                for _, angle, distance, _, _, created_at in reversed(self._latest_rows(limit, device))]
+
+    # Um escritor de cada vez (BEGIN IMMEDIATE): os ids ficam visíveis por
+    # ordem e a keyset query basta
+    def since(self, cursor, limit, device=None):
+        sql = 'SELECT id, angle, distance, timestamp, device_id, created_at FROM radar_data WHERE id > ?'
+        params = [cursor]
+        if device is not None:
+            sql += ' AND device_id = ?'
+            params.append(device)
+        sql += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+        with self.connection() as conn:
+            return [self._row(r) for r in conn.execute(sql, params).fetchall()]
+
+    def last_id(self):
+        with self.connection() as conn:
+            return conn.execute('SELECT coalesce(max(id), 0) FROM radar_data').fetchone()[0]
+
+    # Só o intervalo pedido sai da base (índice em created_at / angle /
+    # device_id); a agregação em si é a mesma do modo em memória
+    def aggregate(self, start, end, bucket, angle=None, device=None):
+        sql = 'SELECT angle, distance, created_at FROM radar_data WHERE created_at >= ? AND created_at < ?'
+        params = [start.timestamp(), end.timestamp()]
+        if angle is not None:
+            sql += ' AND angle = ?'
+            params.append(angle)
+        if device is not None:
+            sql += ' AND device_id = ?'
+            params.append(device)
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if not rows:
+            return []
+        angles, distances, created_at = zip(*rows)
+        columns = {'angle': [angles], 'distance': [distances], 'received_at': [created_at]}
+        return aggregate_columns(columns, start, end, bucket, angle)
+
+    def export(self, start, end, device=None, page_size=2000):
+        sql = '''
+            SELECT id, angle, distance, timestamp, device_id, created_at
+            FROM radar_data WHERE created_at >= ? AND created_at < ?
+        '''
+        params = [start.timestamp(), end.timestamp()]
+        if device is not None:
+            sql += ' AND device_id = ?'
+            params.append(device)
+        stack = ExitStack()
+        try:
+            conn = stack.enter_context(self.connection())
+            cur = conn.execute(sql + ' ORDER BY created_at', params)
+        except Exception:
+            stack.close()
+            raise
+        stack.callback(cur.close)
+
+        def pages():
+            while True:
+                page = cur.fetchmany(page_size)
+                if not page:
+                    return
+                yield [(*r[:5], _iso(r[5])) for r in page]
+
+        return Pages(pages(), stack.close)
+
+    def devices(self, since):
+        with self.connection() as conn:
+            return conn.execute(DEVICES_SQL.format(since=':since'), {'since': since}).fetchall()
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM radar_data')
+
+    # Sem tabela de resumos: as leituras antigas são apagadas em blocos
+    def retain(self, keep, chunk_size, summary_keep=None):
+        cutoff = datetime.now() - keep
+        result = {'cutoff': cutoff.isoformat(), 'deleted': 0, 'chunks': 0}
+        started = time.monotonic()
+        while True:
+            with self.transaction() as conn:
+                deleted = conn.execute('''
+                    DELETE FROM radar_data WHERE id IN (
+                        SELECT id FROM radar_data WHERE created_at < ? ORDER BY created_at LIMIT ?
+                    )
+                ''', (cutoff.timestamp(), chunk_size)).rowcount
+            result['chunks'] += 1
+            result['deleted'] += deleted
+            if deleted < chunk_size:
+                break
+        result['seconds'] = round(time.monotonic() - started, 3)
+        if result['deleted']:
+            logger.info(f"🧹 Retenção SQLite: {result['deleted']} leituras removidas em {result['seconds']}s")
+        return result
+
+    # Tamanho pelo intervalo de ids (duas procuras na chave primária, sem
+    # count(*) sobre a tabela): exato enquanto só se apagam as mais antigas
+    def stats(self):
+        with self.connection() as conn:
+            size = conn.execute('SELECT coalesce((SELECT max(id) FROM radar_data) - '
+                                '(SELECT min(id) FROM radar_data) + 1, 0)').fetchone()[0]
+        nbytes = 0
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                nbytes += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return {'engine': self.name, 'path': self.path, 'size': size, 'bytes': nbytes}
@@ -0,0 +1,83 @@
+from array import array
+import json
+import threading
+import time
+
+
+class SweepSnapshot:
+    """Fotografia do varrimento atual: última distância por bin de ângulo.
+
+    Cada leitura atualiza um único bin em O(1). O JSON servido em
+    /api/radar/sweep é reconstruído só quando algo mudou.
+    """
+
+    def __init__(self, resolution=5, max_angle=180):
+        if resolution < 1:
+            raise ValueError("resolution deve ser >= 1")
+        self.resolution = resolution
+        self.max_angle = max_angle
+        self.bins = max_angle // resolution + 1
+        self._distance = array('i', [-1]) * self.bins
+        self._updated_at = array('d', [0.0]) * self.bins
+        self._count = array('q', [0]) * self.bins
+        self._lock = threading.Lock()
+        self._version = 0
+        self._cached = None
+        self._cached_version = -1
+
+    def bin_for(self, angle):
+        if not 0 <= angle <= self.max_angle:
+            return None
+        return min(int(angle / self.resolution + 0.5), self.bins - 1)
+
+    def update(self, angle, distance, at=None):
+        self.update_many([(angle, distance)], at)
+
+    def update_many(self, readings, at=None):
+        at = time.time() if at is None else at
+        with self._lock:
+            for reading in readings:
+                index = self.bin_for(reading[0])
+                if index is None:
+                    continue
+                self._distance[index] = reading[1]
+                self._updated_at[index] = at
+                self._count[index] += 1
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            for i in range(self.bins):
+                self._distance[i] = -1
+                self._updated_at[i] = 0.0
+                self._count[i] = 0
+            self._version += 1
+
+    def is_empty(self):
+        return not any(self._count)
+
+    def _build_locked(self):
+        bins = []
+        for i in range(self.bins):
+            seen = self._count[i] > 0
+            bins.append({
+                'angle': i * self.resolution,
+                'distance': self._distance[i] if seen else None,
+                'updated_at': round(self._updated_at[i], 3) if seen else None,
+                'count': self._count[i],
+            })
+        return json.dumps({
+            'resolution': self.resolution,
+            'sweeps': min(self._count),
+            'bins': bins,
+        }, separators=(',', ':'))
+
+    def payload(self, now=None):
+        """JSON (bytes) com os bins; idade = server_time - updated_at."""
+        with self._lock:
+            if self._cached_version != self._version:
+                self._cached = self._build_locked()
+                self._cached_version = self._version
+            body = self._cached
+        now = time.time() if now is None else now
+        return ('{"server_time":%.3f,' % now + body[1:]).encode()
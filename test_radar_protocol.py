@@ -0,0 +1,82 @@
+"""Testes do protocolo binário sem hardware: python -m unittest (ou pytest)."""
+import struct
+import unittest
+
+from radar_protocol import (HEADER_SIZE, MAX_RECORDS, RECORD_SIZE, FrameError, crc16, decode_frame,
+                            encode_frame, frame_readings)
+
+RECORDS = [(0, 42, 0), (90, 300, 15), (180, 65535, 65535)]
+
+
+def with_crc(body):
+    return body + struct.pack('<H', crc16(body))
+
+
+class Crc16Test(unittest.TestCase):
+    def test_check_vector(self):
+        # Valor de verificação do CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)
+        self.assertEqual(crc16(b'123456789'), 0x29B1)
+
+    def test_empty(self):
+        self.assertEqual(crc16(b''), 0xFFFF)
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_encode_decode(self):
+        data = encode_frame(7, 123456, 4000000000, RECORDS)
+        self.assertEqual(len(data), HEADER_SIZE + len(RECORDS) * RECORD_SIZE + 2)
+        frame = decode_frame(data)
+        self.assertEqual(frame.device_id, 7)
+        self.assertEqual(frame.sweep_seq, 123456)
+        self.assertEqual(frame.base_ms, 4000000000)
+        self.assertEqual(frame.flags, 0)
+        self.assertEqual(frame.records, RECORDS)
+
+    def test_empty_and_full_frames(self):
+        self.assertEqual(decode_frame(encode_frame(0, 0, 0, [])).records, [])
+        records = [(i % 181, i, i) for i in range(MAX_RECORDS)]
+        self.assertEqual(decode_frame(encode_frame(1, 2, 3, records)).records, records)
+
+    def test_readings(self):
+        frame = decode_frame(encode_frame(1, 1, 1000, RECORDS))
+        self.assertEqual(frame_readings(frame), [(0, 42, 1000), (90, 300, 1015), (180, 65535, 66535)])
+
+    def test_encode_rejects_out_of_range(self):
+        with self.assertRaises(FrameError):
+            encode_frame(1, 1, 0, [(0, 70000, 0)])
+        with self.assertRaises(FrameError):
+            encode_frame(1, 1, 0, [(0, 1, 0)] * (MAX_RECORDS + 1))
+
+
+class DecodeErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.data = encode_frame(3, 9, 500, RECORDS)
+
+    def assertRejected(self, data, message):
+        with self.assertRaises(FrameError) as ctx:
+            decode_frame(data)
+        self.assertIn(message, str(ctx.exception))
+
+    def test_bad_magic(self):
+        self.assertRejected(with_crc(b'XX' + self.data[2:-2]), 'Magic')
+
+    def test_bad_version(self):
+        self.assertRejected(with_crc(self.data[:2] + b'\x02' + self.data[3:-2]), 'Versão')
+
+    def test_short(self):
+        self.assertRejected(self.data[:HEADER_SIZE], 'curto')
+
+    def test_bad_length(self):
+        # Registo a mais ou a menos do que diz o count (CRC recalculado)
+        self.assertRejected(with_crc(self.data[:-2] + b'\x00' * RECORD_SIZE), 'Tamanho')
+        self.assertRejected(with_crc(self.data[:-2 - RECORD_SIZE]), 'Tamanho')
+
+    def test_bad_crc(self):
+        corrupted = bytearray(self.data)
+        corrupted[HEADER_SIZE + 1] ^= 0xFF
+        self.assertRejected(bytes(corrupted), 'CRC')
+        self.assertRejected(self.data[:-2] + bytes([self.data[-2] ^ 1, self.data[-1]]), 'CRC')
+
+
+if __name__ == '__main__':
+    unittest.main()
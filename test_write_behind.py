@@ -0,0 +1,59 @@
+"""Testes da fila write-behind: python -m unittest (ou pytest)."""
+import threading
+import time
+import unittest
+
+from write_behind import QueueFull, WriteBehindQueue
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+        self.flushed = threading.Event()
+
+    def __call__(self, rows):
+        self.batches.append(list(rows))
+        self.flushed.set()
+
+
+class WriteBehindQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.recorder = Recorder()
+        self.queue = WriteBehindQueue(self.recorder, maxsize=100, batch_size=50, flush_interval=0.1)
+        self.addCleanup(self.queue.close)
+
+    def wait_flush(self, timeout):
+        self.assertTrue(self.recorder.flushed.wait(timeout), 'lote não gravado a tempo')
+        self.recorder.flushed.clear()
+
+    def test_partial_batch_after_idle(self):
+        # Depois de esvaziar, um lote incompleto sai ao fim de flush_interval
+        # e não só quando chegam mais leituras
+        self.queue.put(range(3))
+        self.wait_flush(1.0)
+        time.sleep(0.2)  # thread parada com a fila vazia
+        started = time.monotonic()
+        self.queue.put(range(2))
+        self.wait_flush(1.0)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(self.recorder.batches, [[0, 1, 2], [0, 1]])
+
+    def test_full_batch_flushes_at_once(self):
+        self.queue.flush_interval = 60.0
+        self.queue.put(range(50))
+        self.wait_flush(1.0)
+        self.assertEqual(len(self.recorder.batches[0]), 50)
+
+    def test_rejects_when_full(self):
+        with self.assertRaises(QueueFull):
+            self.queue.put(range(101))
+        self.assertEqual(self.queue.stats()['rejected'], 101)
+
+    def test_close_flushes_remaining(self):
+        self.queue.put(range(5))
+        self.queue.close()
+        self.assertEqual(sum(len(b) for b in self.recorder.batches), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+from array import array
+import math
+import threading
+import time
+
+NO_READING = float('nan')
+
+
+class _Track:
+    __slots__ = ('id', 'x', 'y', 'vx', 'vy', 'hits', 'missed', 'first_seen', 'clock', 'shape')
+
+    def __init__(self, track_id, x, y, at, clock, shape):
+        self.id = track_id
+        self.x = x
+        self.y = y
+        self.vx = 0.0
+        self.vy = 0.0
+        self.hits = 1
+        self.missed = 0
+        self.first_seen = at
+        self.clock = clock
+        self.shape = shape
+
+
+class ObjectTracker:
+    """Deteção e seguimento de objetos a partir dos varrimentos de um radar.
+
+    As leituras atualizam bins de ângulo (como SweepSnapshot). Quando o servo
+    chega a um extremo ou inverte o sentido o varrimento está completo e só
+    os bins tocados desde o último varrimento são convertidos para
+    cartesianas (NumPy, vetorizado).
+    Bins adjacentes com eco (``min_range`` <= distância < ``max_range``) e
+    sem saltos maiores que ``gap`` cm formam um objeto; cada objeto é
+    associado à pista mais próxima da posição prevista a partir do varrimento
+    anterior (até ``match_distance`` cm) para estimar a velocidade. Pistas sem
+    objeto durante mais de ``max_missed`` varrimentos são descartadas.
+
+    As velocidades usam o relógio do dispositivo (``timestamp`` em ms) quando
+    as leituras o trazem: lotes enviados de uma vez ou reenviados chegam
+    juntos ao servidor, mas os varrimentos continuam espaçados no tempo.
+    """
+
+    def __init__(self, resolution=5, max_angle=180, max_range=250, min_range=3, gap=20,
+                 match_distance=50, max_missed=2, alert_distance=30, smoothing=0.5):
+        import numpy as np
+
+        if resolution < 1:
+            raise ValueError("resolution deve ser >= 1")
+        self.resolution = resolution
+        self.max_angle = max_angle
+        self.bins = max_angle // resolution + 1
+        self.max_range = max_range
+        self.min_range = min_range
+        self.gap = gap
+        self.match_distance = match_distance
+        self.max_missed = max_missed
+        self.alert_distance = alert_distance
+        self.smoothing = smoothing
+        # Meio varrimento tocado: inversões antes disso (ex: o salto de volta
+        # a 0° de um firmware que só varre num sentido) não fecham o varrimento
+        self.min_sweep_bins = max(1, self.bins // 2)
+
+        radians = np.radians(np.arange(self.bins) * resolution)
+        self._cos = np.cos(radians)
+        self._sin = np.sin(radians)
+        self._distance = array('d', [NO_READING]) * self.bins
+        self._dirty = bytearray(self.bins)
+        self._dirty_count = 0
+        self._x = np.full(self.bins, np.nan)
+        self._y = np.full(self.bins, np.nan)
+        self._last_bin = None
+        self._direction = 0
+        self._clock = None
+        self._tracks = []
+        self._next_id = 1
+        self._sweeps = 0
+        self._updated_at = None
+        self._snapshot = self._build_locked()
+        self._lock = threading.Lock()
+
+    def bin_for(self, angle):
+        if not 0 <= angle <= self.max_angle:
+            return None
+        return min(int(angle / self.resolution + 0.5), self.bins - 1)
+
+    def update_many(self, readings, at=None):
+        """Aplica [(angle, distance, timestamp, ...), ...]; True se algum varrimento fechou.
+
+        O varrimento fecha ao chegar a um extremo (0 ou ``max_angle``) ou, se
+        o servo inverter antes disso, na primeira leitura no sentido oposto.
+        """
+        at = time.time() if at is None else at
+        completed = False
+        with self._lock:
+            for reading in readings:
+                index = self.bin_for(reading[0])
+                if index is None:
+                    continue
+                if self._last_bin is not None and index != self._last_bin:
+                    direction = 1 if index > self._last_bin else -1
+                    if direction != self._direction:
+                        if self._direction and self._dirty_count >= self.min_sweep_bins:
+                            self._complete_sweep_locked(at)
+                            completed = True
+                        self._direction = direction
+                self._last_bin = index
+                self._clock = reading[2] / 1000 if len(reading) > 2 and reading[2] else at
+                self._distance[index] = reading[1]
+                if not self._dirty[index]:
+                    self._dirty[index] = 1
+                    self._dirty_count += 1
+                if index in (0, self.bins - 1) and self._dirty_count >= self.min_sweep_bins:
+                    self._complete_sweep_locked(at)
+                    completed = True
+        return completed
+
+    def _complete_sweep_locked(self, at):
+        import numpy as np
+
+        distance = np.frombuffer(self._distance, dtype=np.float64)
+        dirty = np.flatnonzero(np.frombuffer(self._dirty, dtype=np.uint8))
+        self._x[dirty] = distance[dirty] * self._cos[dirty]
+        self._y[dirty] = distance[dirty] * self._sin[dirty]
+        self._dirty[:] = bytes(self.bins)
+        self._dirty_count = 0
+
+        self._match_locked(self._cluster(np, distance), at)
+        self._sweeps += 1
+        self._updated_at = at
+        self._snapshot = self._build_locked()
+
+    # Agrupar bins com eco em objetos: um objeto novo começa onde o bin
+    # anterior não tem eco ou a distância salta mais que ``gap``
+    def _cluster(self, np, distance):
+        with np.errstate(invalid='ignore'):
+            hit = (distance >= self.min_range) & (distance < self.max_range)
+        index = np.flatnonzero(hit)
+        if not len(index):
+            return []
+        d = distance[index]
+        breaks = np.ones(len(index), dtype=bool)
+        breaks[1:] = (np.diff(index) > 1) | (np.abs(np.diff(d)) > self.gap)
+        labels = np.cumsum(breaks) - 1
+        starts = np.flatnonzero(breaks)
+        ends = np.append(starts[1:], len(index)) - 1
+
+        counts = np.bincount(labels)
+        x = np.bincount(labels, self._x[index]) / counts
+        y = np.bincount(labels, self._y[index]) / counts
+        nearest = np.minimum.reduceat(d, starts)
+        first, last = index[starts], index[ends]
+        width = np.hypot(self._x[last] - self._x[first], self._y[last] - self._y[first])
+        return [{
+            'x': float(x[i]),
+            'y': float(y[i]),
+            'points': int(counts[i]),
+            'start_angle': int(first[i]) * self.resolution,
+            'end_angle': int(last[i]) * self.resolution,
+            'nearest': int(nearest[i]),
+            'width': round(float(width[i]), 1),
+        } for i in range(len(starts))]
+
+    # Associação gulosa pelo par (objeto, pista) mais próximo, com a pista na
+    # posição prevista pela sua velocidade
+    def _match_locked(self, objects, at):
+        import numpy as np
+
+        tracks = self._tracks
+        matched_tracks, matched_objects = set(), set()
+        if tracks and objects:
+            ox = np.array([o['x'] for o in objects])
+            oy = np.array([o['y'] for o in objects])
+            x, y, vx, vy, clock = np.array([(t.x, t.y, t.vx, t.vy, t.clock) for t in tracks]).T
+            # Relógio que recuou (dispositivo reiniciado): sem previsão
+            dt = np.maximum(self._clock - clock, 0.0)
+            px = x + vx * dt
+            py = y + vy * dt
+            cost = np.hypot(ox[:, None] - px[None, :], oy[:, None] - py[None, :])
+            for flat in np.argsort(cost, axis=None):
+                o, t = divmod(int(flat), len(tracks))
+                if cost[o, t] > self.match_distance:
+                    break
+                if o in matched_objects or t in matched_tracks:
+                    continue
+                matched_objects.add(o)
+                matched_tracks.add(t)
+                self._update_track(tracks[t], objects[o])
+
+        survivors = []
+        for t, track in enumerate(tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        for o, obj in enumerate(objects):
+            if o not in matched_objects:
+                survivors.append(_Track(self._next_id, obj['x'], obj['y'], at, self._clock, obj))
+                self._next_id += 1
+        self._tracks = survivors
+
+    def _update_track(self, track, obj):
+        dt = self._clock - track.clock
+        if dt > 0:
+            vx = (obj['x'] - track.x) / dt
+            vy = (obj['y'] - track.y) / dt
+            if track.hits == 1:
+                track.vx, track.vy = vx, vy
+            else:
+                track.vx += self.smoothing * (vx - track.vx)
+                track.vy += self.smoothing * (vy - track.vy)
+        track.x, track.y = obj['x'], obj['y']
+        track.hits += 1
+        track.missed = 0
+        track.clock = self._clock
+        track.shape = obj
+
+    def _build_locked(self):
+        objects = []
+        for track in self._tracks:
+            if track.missed:
+                continue
+            objects.append({
+                'id': track.id,
+                'x': round(track.x, 1),
+                'y': round(track.y, 1),
+                'angle': round(math.degrees(math.atan2(track.y, track.x)), 1),
+                'distance': round(math.hypot(track.x, track.y), 1),
+                **{k: track.shape[k] for k in ('nearest', 'width', 'points', 'start_angle', 'end_angle')},
+                'vx': round(track.vx, 1) + 0.0,  # sem -0.0 no JSON
+                'vy': round(track.vy, 1) + 0.0,
+                'speed': round(math.hypot(track.vx, track.vy), 1),
+                'sweeps': track.hits,
+                'first_seen': round(track.first_seen, 3),
+            })
+        return {
+            'resolution': self.resolution,
+            'sweeps': self._sweeps,
+            'updated_at': round(self._updated_at, 3) if self._updated_at is not None else None,
+            'alert': any(o['nearest'] < self.alert_distance for o in objects),
+            'objects': objects,
+        }
+
+    def snapshot(self):
+        """Objetos do último varrimento completo (dict pronto para JSON)."""
+        return self._snapshot
+
+    def clear(self):
+        with self._lock:
+            for i in range(self.bins):
+                self._distance[i] = NO_READING
+            self._dirty[:] = bytes(self.bins)
+            self._dirty_count = 0
+            self._x[:] = self._y[:] = float('nan')
+            self._last_bin = None
+            self._direction = 0
+            self._clock = None
+            self._tracks = []
+            self._updated_at = None
+            self._snapshot = self._build_locked()
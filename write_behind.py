@@ -0,0 +1,176 @@
+from collections import deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteBehindQueue:
+    """Fila limitada em processo drenada em lotes por uma thread de fundo.
+
+    ``flush`` recebe uma lista de linhas e deve gravá-las numa única
+    transação. Um lote é gravado quando atinge ``batch_size`` linhas ou
+    quando a mais antiga está na fila há ``flush_interval`` segundos.
+    """
+
+    def __init__(self, flush, maxsize=10000, batch_size=500, flush_interval=1.0,
+                 put_timeout=0.0, retry_delay=1.0, max_retry_delay=30.0):
+        self._flush = flush
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._oldest_at = None
+        self._thread = None
+        self._stopping = False
+        self._flushing = 0
+        self._counters = {
+            'enqueued': 0,
+            'flushed': 0,
+            'rejected': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+        }
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, name='write-behind-flusher', daemon=True)
+                self._thread.start()
+
+    def put(self, rows):
+        """Enfileira as linhas; levanta QueueFull se não houver espaço a tempo."""
+        rows = list(rows)
+        if len(rows) > self.maxsize:
+            with self._cond:
+                self._counters['rejected'] += len(rows)
+            raise QueueFull(f"lote maior que a fila ({self.maxsize})")
+        if self._thread is None:
+            self.start()
+        deadline = time.monotonic() + self.put_timeout
+        with self._cond:
+            while len(self._items) + len(rows) > self.maxsize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    self._counters['rejected'] += len(rows)
+                    raise QueueFull(f"fila cheia ({len(self._items)}/{self.maxsize})")
+                self._cond.wait(remaining)
+            # Fila vazia: a thread espera sem prazo e tem de armar o
+            # flush_interval a partir desta leitura
+            wake = not self._items
+            if wake:
+                self._oldest_at = time.monotonic()
+            self._items.extend(rows)
+            self._counters['enqueued'] += len(rows)
+            if wake or len(self._items) >= self.batch_size:
+                self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        with self._cond:
+            flushes = self._counters['flushes']
+            return {
+                'depth': len(self._items),
+                'in_flight': self._flushing,
+                'maxsize': self.maxsize,
+                'batch_size': self.batch_size,
+                **self._counters,
+                'last_flush_ms': round(self._last_flush_ms, 3),
+                'max_flush_ms': round(self._max_flush_ms, 3),
+                'avg_flush_ms': round(self._total_flush_ms / flushes, 3) if flushes else 0.0,
+            }
+
+    def close(self, timeout=10.0):
+        """Para a thread depois de gravar tudo o que estiver na fila."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        # Sem thread (ou ela não terminou a tempo): gravar o resto aqui
+        if thread is None or not thread.is_alive():
+            while self._drain_once():
+                pass
+
+    # --- thread de fundo -------------------------------------------------
+
+    def _run(self):
+        delay = self.retry_delay
+        while True:
+            with self._cond:
+                while not self._stopping and not self._ready_locked():
+                    self._cond.wait(self._wait_time_locked())
+                if self._stopping and not self._items:
+                    return
+            if self._drain_once():
+                delay = self.retry_delay
+            elif self._items:
+                # Falha ao gravar: esperar antes de tentar de novo
+                with self._cond:
+                    if self._stopping:
+                        return
+                    self._cond.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def _ready_locked(self):
+        if not self._items:
+            return False
+        if len(self._items) >= self.batch_size:
+            return True
+        return time.monotonic() - self._oldest_at >= self.flush_interval
+
+    def _wait_time_locked(self):
+        if not self._items:
+            return None
+        return max(0.0, self.flush_interval - (time.monotonic() - self._oldest_at))
+
+    def _drain_once(self):
+        with self._cond:
+            if not self._items:
+                return False
+            n = min(self.batch_size, len(self._items))
+            batch = [self._items.popleft() for _ in range(n)]
+            self._oldest_at = time.monotonic() if self._items else None
+            self._flushing = n
+            self._cond.notify_all()  # libera produtores à espera de espaço
+
+        started = time.perf_counter()
+        try:
+            self._flush(batch)
+        except Exception as e:
+            logger.error(f"❌ Erro ao gravar lote da fila ({n} leituras): {e}")
+            with self._cond:
+                # Devolver à frente da fila mantendo a ordem original
+                self._items.extendleft(reversed(batch))
+                self._oldest_at = time.monotonic()
+                self._flushing = 0
+                self._counters['flush_errors'] += 1
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._cond:
+            self._flushing = 0
+            self._counters['flushes'] += 1
+            self._counters['flushed'] += n
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        return True